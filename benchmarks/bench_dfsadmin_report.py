@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+"""
+Micro-benchmark of the dfsadmin report parser on a synthetic report with
+5000 datanodes. Each parser runs in a forked child so the peak RSS of one
+run does not hide the other. The legacy parser buffers the whole output, as
+communicate() did, before parsing it.
+
+    python benchmarks/bench_dfsadmin_report.py [DATANODES]
+"""
+
+import os
+import re
+import resource
+import sys
+import time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+import dfsadminReport
+
+DATANODE = """Name: 10.%d.%d.%d:50010 (dn%05d.example.com)
+Hostname: dn%05d.example.com
+Decommission Status : Normal
+Configured Capacity: 47242217533440 (42.97 TB)
+DFS Used: 28323486629888 (25.76 TB)
+Non DFS Used: 2363187826688 (2.15 TB)
+DFS Remaining: 16555543076864 (15.06 TB)
+DFS Used%%: 59.95%%
+DFS Remaining%%: 35.04%%
+Configured Cache Capacity: 0 (0 B)
+Cache Used: 0 (0 B)
+Cache Remaining: 0 (0 B)
+Cache Used%%: 100.00%%
+Cache Remaining%%: 0.00%%
+Xceivers: 12
+Last contact: Mon Oct 10 10:10:10 CEST 2016
+
+"""
+
+def report(datanodes):
+    yield "Configured Capacity: 236211087667200 (214.83 TB)\n"
+    yield "Present Capacity: 224395148771328 (204.09 TB)\n"
+    yield "DFS Remaining: 82777715384320 (75.28 TB)\n"
+    yield "DFS Used: 141617433387008 (128.80 TB)\n"
+    yield "DFS Used%: 63.11%\n"
+    yield "Under replicated blocks: 12\n"
+    yield "Blocks with corrupt replicas: 0\n"
+    yield "Missing blocks: 0\n"
+    yield "\n-------------------------------------------------\n"
+    yield "Live datanodes (%d):\n\n" % datanodes
+    for i in range(datanodes):
+        for line in (DATANODE % (i/65536,(i/256)%256,i%256,i,i)).splitlines(True):
+            yield line
+
+def legacy_parse(output):
+    hdfsreport = dict()
+    host = 'Total'
+    hdfsreport[host]=dict()
+    for line in output.splitlines():
+        m = re.match('^(?P<FIELD>\w+(\s\w+)*%?)\s*:\s*(?P<VALUE>.*?)(\s*\((?P<HUMAN>.+)\))?$',line)
+        if m:
+            if m.group('FIELD')=="Name":
+                host=m.group('HUMAN')
+                hdfsreport[host]=dict()
+                hdfsreport[host][m.group('FIELD')] = m.group('VALUE')
+            else:
+                hdfsreport[host][m.group('FIELD')] = m.group('VALUE')
+                if m.group('HUMAN'):
+                    hdfsreport[host][m.group('FIELD')+'_human'] = m.group('HUMAN')
+        m = re.match('Live datanodes\s+\((?P<VALUE>.+?)\)',line)
+        if m:
+            hdfsreport['Total']['Datanodes available']=m.group('VALUE')
+    return hdfsreport
+
+def run(name,datanodes):
+    rfd,wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.time()
+        if name == 'legacy':
+            hdfsreport = legacy_parse(''.join(report(datanodes)))
+        else:
+            hdfsreport = dfsadminReport.parse(report(datanodes))
+        elapsed = time.time() - start
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+        os.write(wfd,('%f %d %d' % (elapsed,rss,len(hdfsreport) - 1)).encode())
+        os._exit(0)
+    os.close(wfd)
+    result = os.read(rfd,1024).decode().split()
+    os.close(rfd)
+    os.waitpid(pid,0)
+    return float(result[0]),int(result[1]),int(result[2])
+
+def main():
+    datanodes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for name in ['legacy','streaming']:
+        elapsed,rss,parsed = min([run(name,datanodes) for i in range(3)])
+        sys.stdout.write('%-10s %5d datanodes parsed in %7.1f ms, peak RSS growth %6d KB\n' % (name,parsed,elapsed*1000,rss))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+"""
+Benchmark of the kafka zookeeper reads of check_zookeeper_znode against a
+local zookeeper stand-in holding a cluster with 10k partitions. The
+stand-in answers every request after a fixed round trip time, like a
+zookeeper server in the same LAN, and several requests can be in flight
+on the session as on a real zookeeper connection.
+
+    python benchmarks/bench_kafka_znode.py [TOPICS] [PARTITIONS] [RTT_MS]
+"""
+
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+import ast
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+import kafkaState
+from kazoo.exceptions import NoNodeError
+
+class AsyncResult:
+    def __init__(self):
+        self.event = threading.Event()
+
+    def set(self,value,exception=None):
+        self.value = value
+        self.exception = exception
+        self.event.set()
+
+    def get(self,block=True,timeout=None):
+        self.event.wait(timeout)
+        if self.exception:
+            raise self.exception
+        return self.value
+
+class ZookeeperStandIn:
+    def __init__(self,znodes,rtt):
+        self.znodes = znodes
+        self.children = dict()
+        for path in znodes:
+            parent,name = path.rsplit('/',1)
+            self.children.setdefault(parent,[]).append(name)
+        self.rtt = rtt
+        self.queue = []
+        self.sequence = 0
+        self.lock = threading.Condition()
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        while 1:
+            with self.lock:
+                while not self.queue:
+                    self.lock.wait()
+                due,sequence,result,value,exception = self.queue[0]
+                if due > time.time():
+                    self.lock.wait(due - time.time())
+                    continue
+                heapq.heappop(self.queue)
+            result.set(value,exception)
+
+    def request(self,value,exception=None):
+        result = AsyncResult()
+        with self.lock:
+            self.sequence += 1
+            heapq.heappush(self.queue,(time.time() + self.rtt,self.sequence,result,value,exception))
+            self.lock.notify()
+        return result
+
+    def get_async(self,path):
+        if path in self.znodes:
+            return self.request((self.znodes[path],None))
+        return self.request(None,NoNodeError())
+
+    def get_children_async(self,path):
+        return self.request(self.children.get(path,[]))
+
+    def get(self,path):
+        return self.get_async(path).get()
+
+    def get_children(self,path):
+        return self.get_children_async(path).get()
+
+    def exists(self,path):
+        return self.request(True if path in self.znodes or path in self.children else None).get()
+
+def cluster(topics,partitions,brokers=6):
+    znodes = dict()
+    for broker in range(brokers):
+        znodes['/brokers/ids/%d' % broker] = json.dumps({'host':'broker%d' % broker,'port':9092,'jmx_port':-1})
+    for topic in range(topics):
+        assignment = dict()
+        for partition in range(partitions):
+            replicas = [(partition + i) % brokers for i in range(3)]
+            assignment[str(partition)] = replicas
+            znodes['/brokers/topics/topic%d/partitions/%d/state' % (topic,partition)] = json.dumps(
+                {'controller_epoch':1,'leader':replicas[0],'version':1,'leader_epoch':0,'isr':replicas})
+        znodes['/brokers/topics/topic%d' % topic] = json.dumps({'version':1,'partitions':assignment})
+    return znodes
+
+def serial(zk):
+    ids_parsed = dict()
+    topics_parsed = dict()
+    for host in zk.get_children('/brokers/ids'):
+        ids_parsed[str(host)] = ast.literal_eval(zk.get('/brokers/ids/%d' % int(host))[0])
+    for topic in zk.get_children('/brokers/topics'):
+        topic_stat = ast.literal_eval(zk.get('/brokers/topics/%s' % str(topic))[0])
+        topics_parsed[str(topic)] = {'partitions':topic_stat['partitions'],'isr':dict()}
+        for partition in topic_stat['partitions'].keys():
+            output = ast.literal_eval(zk.get('/brokers/topics/%s/partitions/%s/state' % (topic,partition))[0])
+            topics_parsed[str(topic)]['isr'][partition] = output['isr']
+    return sum([len(topic['isr']) for topic in topics_parsed.values()])
+
+def pipelined(zk,max_in_flight):
+    kafkaState.get_brokers(zk,max_in_flight)
+    return sum([len(partitions) for partitions in kafkaState.get_partitions(zk,None,max_in_flight).values()])
+
+def main():
+    topics = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    partitions = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    rtt = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.0005
+    zk = ZookeeperStandIn(cluster(topics,partitions),rtt)
+    runs = [('serial',lambda: serial(zk))]
+    for max_in_flight in [10,50,200]:
+        runs.append(('pipelined %d' % max_in_flight,lambda max_in_flight=max_in_flight: pipelined(zk,max_in_flight)))
+    for name,run in runs:
+        start = time.time()
+        read = run()
+        sys.stdout.write('%-14s %6d partitions read in %8.1f ms\n' % (name,read,(time.time() - start) * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+import argparse
+import socket
+import sys
+import time
+
+UNKNOWN = 3
+
+def parser():
+    version="0.1"
+    parser = argparse.ArgumentParser(description="Returns the last result of a check kept warm by collector.py")
+    parser.add_argument('-c','--check',action='store',required=True)
+    parser.add_argument('--socket',action='store',default='/var/run/nagios-hadoop/collector.sock')
+    parser.add_argument('--max_age',action='store',type=int,default=300,help="Seconds before a collected result is considered stale")
+    parser.add_argument('-t','--timeout',action='store',type=float,default=5)
+    parser.add_argument('-v','--version', action='version', version='%(prog)s ' + version)
+    args = parser.parse_args()
+    return args
+
+def query(path,check,timeout):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(timeout)
+    s.connect(path)
+    s.sendall((check + '\n').encode('utf-8'))
+    data = []
+    while 1:
+        buff = s.recv(65536)
+        if not buff:
+            break
+        data.append(buff)
+    s.close()
+    header,output = b''.join(data).decode('utf-8').split('\n',1)
+    exitcode,timestamp = header.split()
+    return int(exitcode),int(timestamp),output
+
+def main():
+    args = parser()
+    try:
+        exitcode,timestamp,output = query(args.socket,args.check,args.timeout)
+    except Exception as e:
+        sys.stdout.write('UNKNOWN: collector unreachable on %s: %s\n' % (args.socket,e))
+        sys.exit(UNKNOWN)
+    age = int(time.time()) - timestamp
+    if timestamp and age > args.max_age:
+        sys.stdout.write('UNKNOWN: last result of %s is %ds old\n' % (args.check,age))
+        exitcode = UNKNOWN
+    else:
+        sys.stdout.write(output)
+    sys.exit(exitcode)
+
+if __name__ == '__main__':
+    main()
@@ -23,14 +23,41 @@
 from requests_kerberos import HTTPKerberosAuth
 import kerberosWrapper
 import stringContext
+import parallel
+import jmx
+import dfsadminReport
+import stats
 import os
 import argparse
 import requests
 import re
 import subprocess
+import time
+import json
+from collections import OrderedDict
 import nagiosplugin
 
 
+"""
+Return {NAMESERVICE:[NAMENODE]} where NAMENODE is a haadmin service id, or an
+http address when the HA state is read from JMX. NAMESERVICE is '' unless
+--namenode_hosts entries are written as NAMESERVICE/host:port
+"""
+def nameservices(args):
+    if args.ha_source != 'jmx':
+        return OrderedDict([('',args.namenodes.split(','))])
+    return namenode_hosts(args)
+
+"""
+Return {NAMESERVICE:[HOST:PORT]} of --namenode_hosts
+"""
+def namenode_hosts(args):
+    nameservices = OrderedDict()
+    for namenode in args.namenode_hosts.split(','):
+        nameservice,sep,address = namenode.rpartition('/')
+        nameservices.setdefault(nameservice,[]).append(address)
+    return nameservices
+
 def parser():
     version="0.1"
     parser = argparse.ArgumentParser(description="Checks datanode")
@@ -38,8 +65,18 @@ def parser():
     parser.add_argument('-s', '--secure',action='store_true')
     parser.add_argument('-k', '--keytab',action='store')
     parser.add_argument('--ha',action='store_true')
+    parser.add_argument('--source',action='store',choices=['dfsadmin','jmx'],default='dfsadmin',help="Read the hdfs report from 'hdfs dfsadmin -report' or the namenode JMX")
+    parser.add_argument('--ha_source',action='store',choices=['haadmin','jmx'],default='haadmin',help="Read the namenodes HA state from 'hdfs haadmin' or the namenode JMX")
+    parser.add_argument('--ha_timeout',action='store',type=float,default=2,help="Seconds to wait for the namenodes HA state with --ha_source jmx")
+    parser.add_argument('--namenode_hosts',action='store',default='localhost:50070',help="Namenode http addresses used by --source jmx and --ha_source jmx, prefixed with NAMESERVICE/ in federated clusters")
     parser.add_argument('--datanode_port',action='store',type=int,default=50075)
+    parser.add_argument('--datanode_workers',action='store',type=int,default=20,help="Datanodes queried at the same time")
+    parser.add_argument('--http_timeout',action='store',type=float,default=5,help="Seconds to wait for each datanode")
+    parser.add_argument('--deadline',action='store',type=float,default=30,help="Seconds to wait for all datanodes")
+    parser.add_argument('--datanode_jmx',action='store_true',help="Also sweep the DataNode JMX beans of every datanode")
+    parser.add_argument('--top_datanodes',action='store',type=int,default=3,help="Worst datanodes listed for each --datanode_jmx metric")
     parser.add_argument('--cache_file',action='store', default='/tmp/nagios.krb')
+    parser.add_argument('--reuse_cache',action='store_true',help="Keep the kerberos ticket cache between checks")
     parser.add_argument('-nn','--namenodes',action='store',default='nn1,nn2')
     parser.add_argument('--warning_used',action='store', type=float,default=70.00)
     parser.add_argument('--warning_blocks',action='store', type=int,default=250000)
@@ -47,6 +84,13 @@ def parser():
     parser.add_argument('--warning_corrupt',action='store',type=int,default=0)
     parser.add_argument('--warning_missing',action='store',type=int,default=0)
     parser.add_argument('--warning_ureplicated',action='store',type=int,default=20)
+    parser.add_argument('--warning_scan_errors',action='store',type=int,default=1)
+    parser.add_argument('--warning_unreachable',action='store',type=int,default=5)
+    parser.add_argument('--warning_jmx_unreachable',action='store',default='5',help="Datanodes whose JMX could not be read by --datanode_jmx")
+    parser.add_argument('--warning_failed_volumes',action='store',default='0',help="Failed volumes in the whole cluster")
+    parser.add_argument('--warning_xceivers',action='store',default='2000',help="Xceivers of the busiest datanode")
+    parser.add_argument('--warning_block_latency',action='store',default='200',help="95th percentile of the datanodes read and write block op average time in ms")
+    parser.add_argument('--warning_heartbeat',action='store',default='30',help="Seconds since the oldest datanode heartbeat")
     parser.add_argument('--critical_used',action='store', type=float,default=85)
     parser.add_argument('--critical_blocks',action='store', type=int,default=350000)
     parser.add_argument('--critical_balanced',action='store',type=float,default=10.00)
@@ -54,6 +98,13 @@ def parser():
     parser.add_argument('--critical_datanodes',action='store',type=int,default=3)
     parser.add_argument('--critical_missing',action='store',type=int,default=10)
     parser.add_argument('--critical_ureplicated',action='store',type=int,default=50)
+    parser.add_argument('--critical_scan_errors',action='store',type=int,default=10)
+    parser.add_argument('--critical_unreachable',action='store',type=int,default=20)
+    parser.add_argument('--critical_jmx_unreachable',action='store',default='20')
+    parser.add_argument('--critical_failed_volumes',action='store',default='3')
+    parser.add_argument('--critical_xceivers',action='store',default='3500')
+    parser.add_argument('--critical_block_latency',action='store',default='1000')
+    parser.add_argument('--critical_heartbeat',action='store',default='60')
     parser.add_argument('-v','--version', action='version', version='%(prog)s ' + version)
     args = parser.parse_args()
     if args.secure and (args.principal is None or args.keytab is None):
@@ -63,48 +114,70 @@ def parser():
 class Hdfs(nagiosplugin.Resource):
     totalTest=['DFS Used%']
     datanodesTest=['Total Blocks']
+    admin_states={'In Service':'Normal'}
 
     """
-    Return dict struture with the format:
-    {NODE<<String>>:{FIELD<<String>>:VALUE}}
-    where NODE could be Total or a datanode FQDN and FIELD:
-        'Blocks with corrupt replicas'
-        'Configured Capacity'
-        'Decommission Status'
-        'DFS Remaining'
-        'DFS Used'
-        'DFS Used%'
-        'Hostname'
-        'Last contact'
-        'Missing blocks'
-        'Non DFS Used'
-        'Present Capacity'
-        'Under replicated blocks'
+    Stream 'hdfs dfsadmin -report' through dfsadminReport.parse, see there
+    the returned structure
     """
     def parser_hdfsreport(self):
-        p = subprocess.Popen(['hdfs','dfsadmin','-report'],stdout=subprocess.PIPE) 
-        output,err = p.communicate()
+        p = subprocess.Popen(['hdfs','dfsadmin','-report'],stdout=subprocess.PIPE)
+        hdfsreport = dfsadminReport.parse(iter(p.stdout.readline,''))
+        if p.wait() != 0:
+            return 2,"Critical: hdfs dfsadmin -report exited with %d" % p.returncode
+        return 0,hdfsreport
+
+    """
+    Same output as parser_hdfsreport but read from the FSNamesystem and
+    NameNodeInfo beans of the active namenode of every nameservice in
+    --namenode_hosts. The block counts are per namespace and summed, the
+    capacity is shared by the federated namespaces and the live datanodes
+    are merged.
+    """
+    def parser_jmxreport(self):
+        def namenode_beans(namenode):
+            host,port = namenode.split(':')
+            fsnamesystem = jmx.get_beans(self.http,host,port,'Hadoop:service=NameNode,name=FSNamesystem',self.http_timeout)
+            nninfo = jmx.get_beans(self.http,host,port,'Hadoop:service=NameNode,name=NameNodeInfo',self.http_timeout)
+            return fsnamesystem[0],nninfo[0]
+        results,errors = parallel.map_bounded(namenode_beans,self.namenode_hosts,len(self.namenode_hosts),self.deadline)
+        fsnamesystems = []
+        live = dict()
+        for nameservice,namenodes in self.namenode_services.items():
+            reachable = [namenode for namenode in namenodes if namenode in results]
+            if not reachable:
+                return 2,"Critical: " + ('%s ' % nameservice if nameservice else '') + ', '.join(['%s %s' % (namenode,errors[namenode]) for namenode in namenodes])
+            active = [namenode for namenode in reachable if results[namenode][0].get('tag.HAState','active') == 'active']
+            fsnamesystem,nninfo = results[(active or reachable)[0]]
+            fsnamesystems.append(fsnamesystem)
+            live.update(json.loads(nninfo['LiveNodes']))
+        fsnamesystem = fsnamesystems[0]
         hdfsreport = dict()
-        if err is None:
-            host = 'Total'
-            hdfsreport[host]=dict()
-            for line in output.splitlines():
-                m = re.match('^(?P<FIELD>\w+(\s\w+)*%?)\s*:\s*(?P<VALUE>.*?)(\s*\((?P<HUMAN>.+)\))?$',line)
-                if m:
-                    if m.group('FIELD')=="Name":
-                        host=m.group('HUMAN')
-                        hdfsreport[host]=dict()
-                        hdfsreport[host][m.group('FIELD')] = m.group('VALUE')
-                    else:
-                        hdfsreport[host][m.group('FIELD')] = m.group('VALUE')
-                        if m.group('HUMAN'):
-                            hdfsreport[host][m.group('FIELD')+'_human'] = m.group('HUMAN')
-                m = re.match('Live datanodes\s+\((?P<VALUE>.+?)\)',line)
-                if m:
-                  live=m.group('VALUE')
-                  hdfsreport['Total']['Datanodes available']=live
-        else:
-            return 2,"Critical: "+err
+        present = fsnamesystem['CapacityUsed'] + fsnamesystem['CapacityRemaining']
+        hdfsreport['Total'] = {
+            'Configured Capacity':str(fsnamesystem['CapacityTotal']),
+            'Present Capacity':str(present),
+            'DFS Remaining':str(fsnamesystem['CapacityRemaining']),
+            'DFS Used':str(fsnamesystem['CapacityUsed']),
+            'DFS Used%':'%.2f%%' % (fsnamesystem['CapacityUsed']*100.0/present if present else 0),
+            'Under replicated blocks':str(sum([namespace['UnderReplicatedBlocks'] for namespace in fsnamesystems])),
+            'Blocks with corrupt replicas':str(sum([namespace['CorruptBlocks'] for namespace in fsnamesystems])),
+            'Missing blocks':str(sum([namespace['MissingBlocks'] for namespace in fsnamesystems])),
+            'Datanodes available':str(len(live))}
+        now = time.time()
+        for name,node in live.items():
+            host = name.split(':')[0]
+            hdfsreport[host] = {
+                'Name':node.get('xferaddr',name),
+                'Section':'Live',
+                'Hostname':host,
+                'Decommission Status':self.admin_states.get(node['adminState'],node['adminState']),
+                'Configured Capacity':str(node['capacity']),
+                'DFS Used':str(node['usedSpace']),
+                'Non DFS Used':str(node['nonDfsUsedSpace']),
+                'DFS Remaining':str(node['remaining']),
+                'DFS Used%':'%.2f%%' % (node['usedSpace']*100.0/node['capacity'] if node['capacity'] else 0),
+                'Last contact':time.strftime('%a %b %d %H:%M:%S %Z %Y',time.localtime(now - node['lastContact']))}
         return 0,hdfsreport
 
     """
@@ -126,15 +199,90 @@ class Hdfs(nagiosplugin.Resource):
        'Progress this period'
        'Time left in cur period'
     """
-    def blockscanner(self,datanode,port):
+    def blockscanner(self,datanode):
         blockscanner=dict()
-        output = requests.get("http://" + datanode + ':' + str(port) + "/blockScannerReport", auth=self.html_auth)
+        output = self.http.get("http://" + datanode + ':' + str(self.datanode_port) + "/blockScannerReport", timeout=self.http_timeout)
+        output.raise_for_status()
         for line in output.content.splitlines():
             m = re.match('^(\w+(\s\w+)*)\s*:\s*(\d*)$',line)
             if m:
                 blockscanner[m.group(1)] = int(m.group(3))
         return blockscanner
 
+    """
+    Query every datanode /blockScannerReport at the same time over a shared
+    session. Datanodes that fail or miss the deadline get None.
+    """
+    def blockscanners(self,datanodes):
+        results,errors = parallel.map_bounded(self.blockscanner,datanodes,self.datanode_workers,self.deadline)
+        for datanode in datanodes:
+            self.hdfsreport[datanode]['blockscanner']=results.get(datanode)
+        self.blockscanner_errors=errors
+
+    """
+    Return cluster wide blockscanner aggregates:
+    the sum of every field over the reachable datanodes plus
+       'Max datanode blocks'
+       'Verified in last week%'
+       'Unreachable datanodes'
+    """
+    def blockscannerSummary(self):
+        summary=dict()
+        summary['Max datanode blocks']=0
+        for datanode in self.hdfsreport.keys():
+            if datanode != 'Total' and self.hdfsreport[datanode]['blockscanner']:
+                for field,value in self.hdfsreport[datanode]['blockscanner'].items():
+                    summary[field]=summary.get(field,0)+value
+                summary['Max datanode blocks']=max(summary['Max datanode blocks'],self.hdfsreport[datanode]['blockscanner'].get('Total Blocks',0))
+        if summary.get('Total Blocks'):
+            summary['Verified in last week%']=summary.get('Verified in last week',0)*100.0/summary['Total Blocks']
+        else:
+            summary['Verified in last week%']=100.0
+        summary['Unreachable datanodes']=len(self.blockscanner_errors)
+        return summary
+
+    """
+    Return {FIELD:VALUE} from one /jmx?qry=Hadoop:service=DataNode,name=*
+    request, where FIELD could be:
+       'Failed volumes'         NumFailedVolumes of FSDatasetState
+       'Xceivers'               XceiverCount of DataNodeInfo
+       'Write latency'          WriteBlockOpAvgTime of DataNodeActivity
+       'Read latency'           ReadBlockOpAvgTime of DataNodeActivity
+       'Heartbeat age'          oldest LastHeartbeat of BPServiceActorInfo
+    Fields missing in the datanode version are left out.
+    """
+    def datanodeJmx(self,datanode):
+        values=dict()
+        for bean in jmx.get_beans(self.http,datanode,self.datanode_port,'Hadoop:service=DataNode,name=*',self.http_timeout):
+            name=bean['name'].split('name=',1)[-1]
+            if name.startswith('FSDatasetState'):
+                values['Failed volumes']=values.get('Failed volumes',0)+bean.get('NumFailedVolumes',0)
+            elif name == 'DataNodeInfo':
+                if 'XceiverCount' in bean:
+                    values['Xceivers']=bean['XceiverCount']
+                actors=json.loads(bean.get('BPServiceActorInfo') or '[]')
+                if actors:
+                    values['Heartbeat age']=max([int(actor['LastHeartbeat']) for actor in actors])
+            elif name.startswith('DataNodeActivity'):
+                values['Write latency']=bean.get('WriteBlockOpAvgTime',0)
+                values['Read latency']=bean.get('ReadBlockOpAvgTime',0)
+        return values
+
+    """
+    Sweep every datanode JMX at the same time over the shared session and
+    return cluster wide {FIELD:{'p50','p95','max','worst':[(DATANODE,VALUE)]}}
+    plus 'Failed volumes' as a total and 'Unreachable datanodes'
+    """
+    def datanodeJmxSummary(self,datanodes):
+        results,errors = parallel.map_bounded(self.datanodeJmx,datanodes,self.datanode_workers,self.deadline)
+        summary={'Failed volumes':sum([values.get('Failed volumes',0) for values in results.values()]),
+            'Unreachable datanodes':len(errors)}
+        for field in ['Xceivers','Write latency','Read latency','Heartbeat age']:
+            summary[field]=stats.summarize(dict((datanode,values[field]) for datanode,values in results.items() if field in values),self.top_datanodes)
+        summary['Worst failed volumes']=sorted([(datanode,values['Failed volumes']) for datanode,values in results.items()
+            if values.get('Failed volumes')],key=lambda worst: worst[1],reverse=True)[:self.top_datanodes]
+        return summary
+
     def getBalance(self):
         max=0
         min=100
@@ -158,45 +306,97 @@ class Hdfs(nagiosplugin.Resource):
                 namenodes_rol[namenode]=err
         return namenodes_rol
 
+    """
+    Same output as getNamenodesRol but querying the NameNodeStatus bean of
+    every namenode at the same time
+    """
+    def getNamenodesRolJmx(self,namenodes):
+        def state(namenode):
+            host,port = namenode.split(':')
+            return str(jmx.get_beans(self.http,host,port,'Hadoop:service=NameNode,name=NameNodeStatus',self.ha_timeout)[0]['State'])
+        results,errors = parallel.map_bounded(state,namenodes,len(namenodes),self.ha_timeout)
+        namenodes_rol=dict()
+        for namenode in namenodes:
+            namenodes_rol[namenode]=results.get(namenode,errors.get(namenode))
+        return namenodes_rol
 
 
     def __init__(self,args):
         self.html_auth = None
         self.datanode_port=args.datanode_port
+        self.datanode_workers=args.datanode_workers
+        self.http_timeout=args.http_timeout
+        self.deadline=args.deadline
+        self.blockscanner_errors=dict()
+        self.datanode_jmx=None
+        self.top_datanodes=args.top_datanodes
         self.ha=args.ha
+        self.nameservices=nameservices(args)
+        self.namenode_services=namenode_hosts(args)
+        self.namenode_hosts=[namenode for namenodes in self.namenode_services.values() for namenode in namenodes]
+        self.ha_source=args.ha_source
+        self.ha_timeout=args.ha_timeout
         if args.secure:
             self.html_auth=HTTPKerberosAuth()
-            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file)
+            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file,args.reuse_cache)
             os.environ['KRB5CCNAME'] = args.cache_file
-        status,self.hdfsreport = self.parser_hdfsreport()
+        self.http = parallel.session(self.datanode_workers,self.html_auth)
+        if args.source == 'jmx':
+            status,self.hdfsreport = self.parser_jmxreport()
+        else:
+            status,self.hdfsreport = self.parser_hdfsreport()
         if status ==0:
-            for datanode in self.hdfsreport.keys():
-                if datanode != 'Total':
-                    # port = self.hdfsreport[datanode]['Name'].split(':')[1]
-                    self.hdfsreport[datanode]['blockscanner']=self.blockscanner(datanode,self.datanode_port)
-            if args.ha:
+            # Dead datanodes are already counted by the report, querying
+            # them would only wait for the deadline
+            live=dfsadminReport.live_datanodes(self.hdfsreport)
+            self.blockscanners(live)
+            if args.datanode_jmx:
+                self.datanode_jmx=self.datanodeJmxSummary(live)
+            if args.ha and self.ha_source == 'jmx':
+              self.namenodes=self.getNamenodesRolJmx(self.namenode_hosts)
+            elif args.ha:
               self.namenodes=self.getNamenodesRol(args.namenodes)
         if args.secure and auth_token: auth_token.destroy() 
      
     def probe(self):
         if self.ha:
-          yield nagiosplugin.Metric('Active NN',sum([1 for nn in self.namenodes if self.namenodes[nn]=='active']),min=0 ,context ="active nn")
-          yield nagiosplugin.Metric('Standby NN',sum([1 for nn in self.namenodes if self.namenodes[nn]=='standby']),min=0 ,context ="standby nn")
+          for nameservice,namenodes in self.nameservices.items():
+            yield nagiosplugin.Metric(('Active NN ' + nameservice).strip(),sum([1 for nn in namenodes if self.namenodes[nn]=='active']),min=0 ,context ="active nn")
+            yield nagiosplugin.Metric(('Standby NN ' + nameservice).strip(),sum([1 for nn in namenodes if self.namenodes[nn]=='standby']),min=0 ,context =("standby nn " + nameservice).strip())
         yield nagiosplugin.Metric('used%',float(self.hdfsreport['Total']['DFS Used%'].replace('%','')),min=0 ,context = "used")
         yield nagiosplugin.Metric('datanodes',int(self.hdfsreport['Total']['Datanodes available']),min=0 ,context = "datanodes")
         yield nagiosplugin.Metric('under_replication', int(self.hdfsreport['Total']['Under replicated blocks']), min = 0, context = "ureplicated")
         yield nagiosplugin.Metric('missing_blocks',int(self.hdfsreport['Total']['Missing blocks']),min=0 , context = "missing")
         yield nagiosplugin.Metric('corrupted_replicas',int(self.hdfsreport['Total']['Blocks with corrupt replicas']),min=0, context = "corrupt")
         yield nagiosplugin.Metric('balanced',self.getBalance(),min=0, context = "balanced")
-        #for datanode in self.hdfsreport.keys():
-        #    if datanode != 'Total':
-        #        yield nagiosplugin.Metric(datanode, int(self.hdfsreport[datanode]['blockscanner']['Total Blocks']), min = 0,context = "total_blocks")
+        blockscanner=self.blockscannerSummary()
+        yield nagiosplugin.Metric('max_datanode_blocks',blockscanner['Max datanode blocks'],min=0,context = "total_blocks")
+        yield nagiosplugin.Metric('scan_errors',blockscanner.get('Scan errors since restart',0),min=0,context = "scan_errors")
+        yield nagiosplugin.Metric('verified_last_week%',round(blockscanner['Verified in last week%'],2),min=0,max=100,context = "blockscanner")
+        yield nagiosplugin.Metric('blockscanner_unreachable',blockscanner['Unreachable datanodes'],min=0,context = "unreachable")
+        if self.datanode_jmx:
+            yield nagiosplugin.Metric('failed_volumes',self.datanode_jmx['Failed volumes'],min=0,context = "failed_volumes")
+            yield nagiosplugin.Metric('datanode_jmx_unreachable',self.datanode_jmx['Unreachable datanodes'],min=0,context = "jmx_unreachable")
+            for field,metric,checked,context in [('Xceivers','xceivers','max','xceivers'),('Write latency','write_latency','p95','block_latency'),
+                    ('Read latency','read_latency','p95','block_latency'),('Heartbeat age','heartbeat_age','max','heartbeat')]:
+                for stat in ['p50','p95','max']:
+                    yield nagiosplugin.Metric('%s_%s' % (metric,stat),self.datanode_jmx[field][stat],min=0,context = context if stat == checked else "datanode_jmx")
         
 
 class HdfsSummary(nagiosplugin.Summary):
     def ok(self,result):
         return 'Total DFS storage in use is %s%%' % (str(result['used%'].metric))
 
+    def verbose(self,results):
+        msgs = super(HdfsSummary,self).verbose(results)
+        resource = results[0].resource
+        if resource.datanode_jmx:
+            for field in ['Worst failed volumes','Xceivers','Write latency','Read latency','Heartbeat age']:
+                worst = resource.datanode_jmx[field] if field == 'Worst failed volumes' else resource.datanode_jmx[field]['worst']
+                if worst:
+                    msgs.append('%s: %s' % (field.replace('Worst ','').lower(),', '.join(['%s %s' % datanode for datanode in worst])))
+        return msgs
+
 @nagiosplugin.guarded
 def main():
     args = parser()
@@ -204,9 +404,6 @@ def main():
         stringContext.StringContext('active nn',
             1,
             fmt_metric='{value} active namenodes'),
-        stringContext.StringContext('standby nn',
-            len(args.namenodes.split(','))-1,
-            fmt_metric='{value} standby namenodes'),
         nagiosplugin.ScalarContext('used',
             args.warning_used,
             args.critical_used,
@@ -214,7 +411,7 @@ def main():
         nagiosplugin.ScalarContext('total_blocks',
             args.warning_blocks,
             args.critical_blocks,
-            fmt_metric=' is using {value} blocks'),
+            fmt_metric='{value} blocks in the fullest datanode'),
         nagiosplugin.ScalarContext('ureplicated',
             args.warning_ureplicated,
             args.critical_ureplicated,
@@ -231,10 +428,44 @@ def main():
             args.warning_balanced,
             args.critical_balanced,
             fmt_metric='There are {value}% usage difference between datanodes'),
+        nagiosplugin.ScalarContext('scan_errors',
+            args.warning_scan_errors,
+            args.critical_scan_errors,
+            fmt_metric='{value} blockscanner errors'),
+        nagiosplugin.ScalarContext('unreachable',
+            args.warning_unreachable,
+            args.critical_unreachable,
+            fmt_metric='{value} datanodes without blockscanner report'),
+        nagiosplugin.Context('blockscanner'),
+        nagiosplugin.ScalarContext('jmx_unreachable',
+            args.warning_jmx_unreachable,
+            args.critical_jmx_unreachable,
+            fmt_metric='{value} datanodes without JMX response'),
+        nagiosplugin.ScalarContext('failed_volumes',
+            args.warning_failed_volumes,
+            args.critical_failed_volumes,
+            fmt_metric='{value} failed datanode volumes'),
+        nagiosplugin.ScalarContext('xceivers',
+            args.warning_xceivers,
+            args.critical_xceivers,
+            fmt_metric='{value} xceivers in the busiest datanode'),
+        nagiosplugin.ScalarContext('block_latency',
+            args.warning_block_latency,
+            args.critical_block_latency,
+            fmt_metric='{name} is {value} ms'),
+        nagiosplugin.ScalarContext('heartbeat',
+            args.warning_heartbeat,
+            args.critical_heartbeat,
+            fmt_metric='{value}s since the oldest datanode heartbeat'),
+        nagiosplugin.ScalarContext('datanode_jmx'),
         stringContext.StringContext('datanodes',
             args.critical_datanodes,
             fmt_metric='{value} living datanodes'), 
         HdfsSummary())
+    for nameservice,namenodes in nameservices(args).items():
+        check.add(stringContext.StringContext(('standby nn ' + nameservice).strip(),
+            len(namenodes)-1,
+            fmt_metric='{value} standby namenodes'))
     check.main()
 
 if __name__ == '__main__':
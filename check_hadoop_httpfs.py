@@ -45,6 +45,7 @@ def parser():
     parser.add_argument('-k', '--keytab',action='store')
     parser.add_argument('--admin',action='store', default='hdfs')
     parser.add_argument('--cache_file',action='store', default='/tmp/nagios.krb')
+    parser.add_argument('--reuse_cache',action='store_true',help="Keep the kerberos ticket cache between checks")
     parser.add_argument('--namenode',action='store',default='localhost')
     parser.add_argument('--port',action='store',type=int,default=14000)
     parser.add_argument('--path',action='store',required=True)
@@ -96,7 +97,7 @@ class Httpfs(nagiosplugin.Resource):
         self.html_auth = None
         if args.secure:
             self.html_auth=HTTPKerberosAuth()
-            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file)
+            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file,args.reuse_cache)
             os.environ['KRB5CCNAME'] = args.cache_file
         self.namenode=args.namenode
         self.port=args.port
@@ -24,10 +24,15 @@ from requests_kerberos import HTTPKerberosAuth
 import kerberosWrapper
 import stringContext
 import argparse
-import requests
-import re
+import fcntl
+import jmx
+import json
+import parallel
 import nagiosplugin
+import os
 import sys
+import time
+from collections import deque
 
 
 def parser():
@@ -37,11 +42,26 @@ def parser():
     parser.add_argument('-s', '--secure',action='store_true')
     parser.add_argument('-k', '--keytab',action='store')
     parser.add_argument('--cache_file',action='store', default='/tmp/nagios.krb')
+    parser.add_argument('--reuse_cache',action='store_true',help="Keep the kerberos ticket cache between checks")
     parser.add_argument('--qjm',action='store',default='localhost')
     parser.add_argument('--process_warn',action='store',type=int,default=1000)
     parser.add_argument('--process_crit',action='store',type=int,default=5000)
     parser.add_argument('--sync_threshold_warn',action='store',type=int,default=50)
     parser.add_argument('--sync_threshold_crit',action='store',type=int,default=250)
+    parser.add_argument('--journals',action='store',help="Comma separated journal ids to check, every journal found by default")
+    parser.add_argument('--http_timeout',action='store',type=float,default=5,help="Seconds to wait for each journalnode")
+    parser.add_argument('--deadline',action='store',type=float,default=15,help="Seconds to wait for all journalnodes")
+    parser.add_argument('--history_file',action='store',default='/tmp/nagios_qjm_history.json',help="Where the txid and RPC time samples of every journalnode are kept between runs")
+    parser.add_argument('--history_size',action='store',type=int,default=10,help="Samples kept per journalnode")
+    parser.add_argument('--lagging_txns',action='store',type=int,default=50,help="Transactions behind the most advanced node to consider a node lagging")
+    parser.add_argument('--lagging_warn',action='store',default='300',help="Seconds a node has been lagging")
+    parser.add_argument('--lagging_crit',action='store',default='900')
+    parser.add_argument('--catch_up_warn',action='store',default='0:',help="Transactions per second a lagging node gains on the quorum, negative if it falls further behind")
+    parser.add_argument('--catch_up_crit',action='store',default='~:')
+    parser.add_argument('--txns_rate_warn',action='store',help="Transactions per second written to the journal")
+    parser.add_argument('--txns_rate_crit',action='store')
+    parser.add_argument('--process_window_warn',action='store',help="Mean AVG Processing Time over the kept samples")
+    parser.add_argument('--process_window_crit',action='store')
     parser.add_argument('-v','--version', action='version', version='%(prog)s ' + version)
     args = parser.parse_args()
     if args.secure and (args.principal is None or args.keytab is None):
@@ -49,52 +69,178 @@ def parser():
     return args
 
 class Journalnode():
+    """
+    Only the Journal-JID beans (one per journal served) and the RPC activity
+    beans are requested. LastWrittenTxId is kept per journal id. The values
+    are returned, not stored, so a request still running after the deadline
+    cannot change the result of the check.
+    """
     def getValues(self):
-        self.values={'LastWrittenTxId':-1,'RpcProcessingTimeAvgTime':-1}
-        try:
-            response = requests.get("http://" + self.journalnode + ":" + str(self.port) + "/jmx", auth=self.html_auth)
-            if response.ok:
-                for line in response.content.splitlines():
-                    m = re.match('\s*"(?P<FIELD>(LastWrittenTxId)|(RpcProcessingTimeAvgTime))"\s*:\s*(?P<VAL>\d+)',line)
-                    if m:
-                        self.values[m.group('FIELD')]=int(m.group('VAL'))
-            else:
-                self.error_msg=self.journalnode + ":" +str(response.status_code)
-        except Exception as ext:
-            self.error_msg=self.journalnode + ":" + str(ext)
+        values={'LastWrittenTxId':dict(),'RpcProcessingTimeAvgTime':-1}
+        for bean in jmx.get_beans(self.http,self.journalnode,self.port,'Hadoop:service=JournalNode,name=Journal-*',self.timeout):
+            values['LastWrittenTxId'][bean['name'].split('name=Journal-',1)[1]]=int(bean['LastWrittenTxId'])
+        for bean in jmx.get_beans(self.http,self.journalnode,self.port,'Hadoop:service=JournalNode,name=RpcActivityForPort*',self.timeout):
+            values['RpcProcessingTimeAvgTime']=max(values['RpcProcessingTimeAvgTime'],bean['RpcProcessingTimeAvgTime'])
+        return values
 
-    def __init__(self,html_auth,journal,port):
-        self.html_auth = html_auth
+    def __init__(self,http,journal,port,timeout=None):
+        self.http = http
         self.error_msg = 'OK'
         self.journalnode=journal
         self.port=port
-        self.getValues()
+        self.timeout=timeout
+        self.values={'LastWrittenTxId':dict(),'RpcProcessingTimeAvgTime':-1}
 
 class QJM(nagiosplugin.Resource):
     def __init__(self,args):
         html_auth = None
         if args.secure:
             html_auth=HTTPKerberosAuth()
-            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file)
+            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file,args.reuse_cache)
             os.environ['KRB5CCNAME'] = args.cache_file
-        self.qjm=[{'host':journal.split(':')[0], 'journalState':Journalnode(html_auth,journal.split(':')[0],journal.split(':')[1])} for journal in args.qjm.split(',')]
+        http = parallel.session(len(args.qjm.split(',')),html_auth)
+        self.qjm=[{'host':journal.split(':')[0], 'journalState':Journalnode(http,journal.split(':')[0],journal.split(':')[1],args.http_timeout)} for journal in args.qjm.split(',')]
+        results,errors = parallel.map_bounded(Journalnode.getValues,[journal['journalState'] for journal in self.qjm],len(self.qjm),args.deadline)
+        for journalnode,values in results.items():
+            journalnode.values=values
+        for journalnode,error in errors.items():
+            journalnode.error_msg=journalnode.journalnode + ":" + error
+        self.journals=args.journals.split(',') if args.journals else None
         if args.secure and auth_token: auth_token.destroy() 
+        self.minTxId=dict()
+        self.maxTxId=dict()
+        for journal in self.qjm:
+            if journal.get('journalState').error_msg == "OK":
+                for jid,txId in journal.get('journalState').values['LastWrittenTxId'].items():
+                    if self.journals is not None and jid not in self.journals:
+                        continue
+                    self.maxTxId[jid]=max(self.maxTxId.get(jid,-sys.maxint-1),txId)
+                    self.minTxId[jid]=min(self.minTxId.get(jid,sys.maxint),txId)
+        self.history_file=args.history_file
+        self.history_key=','.join(sorted(args.qjm.split(',')))
+        self.history_size=args.history_size
+        self.lagging_txns=args.lagging_txns
+        # NRPE and the collector may run this check at the same time, the
+        # history is read, updated and written under the same lock
+        lock = None
+        try:
+            if self.history_file:
+                lock = open(self.history_file + '.lock','a')
+                fcntl.flock(lock,fcntl.LOCK_EX)
+        except IOError:
+            lock = None
+        try:
+            self.history=self.load_history()
+            self.update_history(time.time())
+            self.save_history()
+        finally:
+            if lock:
+                fcntl.flock(lock,fcntl.LOCK_UN)
+                lock.close()
+
+    """
+    The history file is shared by every check of the host and keyed by the
+    sorted --qjm list, since lags are taken against that quorum:
+    {QJM:{HOST:{'rpc':deque([[TIMESTAMP,RPC_AVG_TIME]]),
+                'journals':{JID:deque([[TIMESTAMP,TXID,LAG]])},
+                'lagging_since':{JID:TIMESTAMP}}}}
+    Every deque keeps the last history_size samples
+    """
+    def read_history(self):
+        try:
+            with open(self.history_file) as cache:
+                saved=json.load(cache)
+        except (IOError,ValueError):
+            saved=dict()
+        return saved if isinstance(saved,dict) else dict()
+
+    def load_history(self):
+        history=dict()
+        saved=self.read_history().get(self.history_key,{})
+        for journal in self.qjm:
+            entry=saved.get(journal['host'],{})
+            history[journal['host']]={'rpc':deque(entry.get('rpc',[]),self.history_size),
+                'journals':dict((jid,deque(samples,self.history_size)) for jid,samples in entry.get('journals',{}).items()),
+                'lagging_since':entry.get('lagging_since',{})}
+        return history
+
+    def save_history(self):
+        if not self.history_file:
+            return
+        history=dict((host,{'rpc':list(entry['rpc']),
+            'journals':dict((jid,list(samples)) for jid,samples in entry['journals'].items()),
+            'lagging_since':entry['lagging_since']}) for host,entry in self.history.items())
+        saved=self.read_history()
+        saved[self.history_key]=history
+        try:
+            tmp_file = '%s.%d' % (self.history_file,os.getpid())
+            with open(tmp_file,'w') as tmp:
+                json.dump(saved,tmp)
+            os.rename(tmp_file,self.history_file)
+        except (IOError,OSError):
+            pass
+
+    """
+    Rates are taken between the oldest and the newest sample kept, so a node
+    briefly behind shows a positive catch up rate and one falling further
+    behind a negative one
+    """
+    def update_history(self,now):
+        self.trends=dict()
+        self.txns_rate=dict()
+        def rate(samples,field):
+            if len(samples) < 2 or samples[-1][0] <= samples[0][0]:
+                return None
+            return float(samples[-1][field]-samples[0][field])/(samples[-1][0]-samples[0][0])
+        for journal in self.qjm:
+            if journal.get('journalState').error_msg != "OK":
+                continue
+            entry=self.history[journal['host']]
+            # -1 means no RPC activity bean was found, it is not a sample
+            if journal.get('journalState').values['RpcProcessingTimeAvgTime'] >= 0:
+                entry['rpc'].append([now,journal.get('journalState').values['RpcProcessingTimeAvgTime']])
+            rpc=[sample[1] for sample in entry['rpc'] if sample[1] >= 0]
+            self.trends[journal['host']]={'rpc_window':sum(rpc)/len(rpc) if rpc else None,'journals':dict()}
+            for jid,txId in journal.get('journalState').values['LastWrittenTxId'].items():
+                if jid not in self.maxTxId:
+                    continue
+                lag=self.maxTxId[jid]-txId
+                samples=entry['journals'].setdefault(jid,deque([],self.history_size))
+                samples.append([now,txId,lag])
+                if lag > self.lagging_txns:
+                    entry['lagging_since'].setdefault(jid,now)
+                else:
+                    entry['lagging_since'].pop(jid,None)
+                txns_rate=rate(samples,1)
+                if txns_rate is not None:
+                    self.txns_rate[jid]=max(self.txns_rate.get(jid,txns_rate),txns_rate)
+                catch_up=rate(samples,2)
+                self.trends[journal['host']]['journals'][jid]={
+                    'lagging':now-entry['lagging_since'][jid] if jid in entry['lagging_since'] else 0,
+                    'catch_up':-catch_up if catch_up is not None and jid in entry['lagging_since'] else None}
 
     def probe(self):
-        minTxId=sys.maxint
-        maxTxId=-sys.maxint-1
         quorumNodes=0
+        def label(name,jid):
+            return name if len(self.maxTxId) == 1 else '%s %s' % (name,jid)
         for journal in self.qjm:
             yield nagiosplugin.Metric('%s Connection status ' % journal.get('host'),journal.get('journalState').error_msg,context='connection')
             if journal.get('journalState').error_msg == "OK":
                 quorumNodes+=1
                 yield nagiosplugin.Metric('%s AVG Processing Time' % journal.get('host'),journal.get('journalState').values['RpcProcessingTimeAvgTime'],context="processing")
-                txId=journal.get('journalState').values['LastWrittenTxId']
-                if txId > maxTxId:
-                    maxTxId = txId
-                if txId < minTxId:
-                    minTxId = txId
-        yield nagiosplugin.Metric('Sync',maxTxId-minTxId,context="sync")
+                trend=self.trends[journal.get('host')]
+                if trend['rpc_window'] is not None:
+                    yield nagiosplugin.Metric('%s Window Processing Time' % journal.get('host'),trend['rpc_window'],context="processing window")
+                for jid,journal_trend in sorted(trend['journals'].items()):
+                    yield nagiosplugin.Metric(label('%s lagging' % journal.get('host'),jid),journal_trend['lagging'],uom='s',min=0,context="lagging")
+                    if journal_trend['catch_up'] is not None:
+                        yield nagiosplugin.Metric(label('%s catch up' % journal.get('host'),jid),journal_trend['catch_up'],context="catch up")
+        if not self.maxTxId:
+            yield nagiosplugin.Metric('Sync',0,context="sync")
+        for jid in sorted(self.maxTxId):
+            yield nagiosplugin.Metric(label('Sync',jid),self.maxTxId[jid]-self.minTxId[jid],context="sync")
+        for jid in sorted(self.txns_rate):
+            yield nagiosplugin.Metric(label('Txns per second',jid),self.txns_rate[jid],min=0,context="txns rate")
         yield nagiosplugin.Metric('Available quorum nodes',quorumNodes,context="quorum")
 
 
@@ -110,6 +256,18 @@ def main():
             args.sync_threshold_crit),
         stringContext.StringContext('connection',
             "OK"),
+        nagiosplugin.ScalarContext('processing window',
+            args.process_window_warn,
+            args.process_window_crit),
+        nagiosplugin.ScalarContext('lagging',
+            args.lagging_warn,
+            args.lagging_crit),
+        nagiosplugin.ScalarContext('catch up',
+            args.catch_up_warn,
+            args.catch_up_crit),
+        nagiosplugin.ScalarContext('txns rate',
+            args.txns_rate_warn,
+            args.txns_rate_crit),
         nagiosplugin.ScalarContext('quorum',
             nagiosplugin.Range("%s:" % str(len(args.qjm.split(','))/2)),
             nagiosplugin.Range("%s:" % str(len(args.qjm.split(','))/2))))
@@ -36,6 +36,7 @@ def parser():
     parser.add_argument('-s', '--secure',action='store_true')
     parser.add_argument('-k', '--keytab',action='store')
     parser.add_argument('--cache_file',action='store', default='/tmp/nagios.krb')
+    parser.add_argument('--reuse_cache',action='store_true',help="Keep the kerberos ticket cache between checks")
     parser.add_argument('-v','--version', action='version', version='%(prog)s ' + version)
     args = parser.parse_args()
     if args.secure and (args.principal is None or args.keytab is None):
@@ -46,7 +47,7 @@ class Hbase(nagiosplugin.Resource):
 
     def __init__(self,args):
         if args.secure:
-            auth_token = krb_wrapper(args.principal,args.keytab,args.cache_file)
+            auth_token = krb_wrapper(args.principal,args.keytab,args.cache_file,args.reuse_cache)
             os.environ['KRB5CCNAME'] = args.cache_file
  
         p = subprocess.Popen(['hbase','hbck'],stdout=subprocess.PIPE,stderr=None)
@@ -37,6 +37,7 @@ def parser():
     parser.add_argument('-s', '--secure',action='store_true')
     parser.add_argument('-k', '--keytab',action='store')
     parser.add_argument('--cache_file',action='store', default='/tmp/nagios.krb')
+    parser.add_argument('--reuse_cache',action='store_true',help="Keep the kerberos ticket cache between checks")
     parser.add_argument('--historyserver',action='store',default='localhost')
     parser.add_argument('--hs_port',action='store',type=int,default='19888')
     parser.add_argument('--alert',action='store',default='critical')
@@ -61,7 +62,7 @@ class Historyserver(nagiosplugin.Resource):
         self.html_auth = None
         if args.secure:
             self.html_auth=HTTPKerberosAuth()
-            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file)
+            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file,args.reuse_cache)
             os.environ['KRB5CCNAME'] = args.cache_file
         if args.historyserver == 'localhost':
             self.historyserver = socket.getfqdn()
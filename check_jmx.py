@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+try:
+    import ConfigParser as configparser
+except ImportError:
+    import configparser
+
+from requests_kerberos import HTTPKerberosAuth
+import kerberosWrapper
+import stringContext
+import argparse
+import jmx
+import nagiosplugin
+import numbers
+import os
+import parallel
+
+def parser():
+    version="0.1"
+    parser = argparse.ArgumentParser(description="Check attributes of the JMX beans of Hadoop daemons")
+    parser.add_argument('-H','--hosts',action='store',required=True,help="Comma separated HOST[:PORT] of the daemons http servers")
+    parser.add_argument('-P','--port',action='store',type=int,help="Port of the hosts given without one")
+    parser.add_argument('-m','--metric',action='append',default=[],metavar='LABEL;QUERY;ATTRIBUTE[;WARN[;CRIT[;AGGREGATE]]]',
+        help="Attribute path of the beans matching the ObjectName pattern QUERY, aggregated with max, min, sum, avg or count, can be repeated")
+    parser.add_argument('-c','--config',action='store',help="File with one [LABEL] section per metric holding query, attribute and optionally warning, critical and aggregate")
+    parser.add_argument('-p', '--principal', action='store', dest='principal')
+    parser.add_argument('-s', '--secure',action='store_true')
+    parser.add_argument('-k', '--keytab',action='store')
+    parser.add_argument('--cache_file',action='store', default='/tmp/nagios.krb')
+    parser.add_argument('--reuse_cache',action='store_true',help="Keep the kerberos ticket cache between checks")
+    parser.add_argument('--workers',action='store',type=int,default=10,help="Requests sent at the same time")
+    parser.add_argument('--http_timeout',action='store',type=float,default=5,help="Seconds to wait for each request")
+    parser.add_argument('--deadline',action='store',type=float,default=30,help="Seconds to wait for every host")
+    parser.add_argument('-v','--version', action='version', version='%(prog)s ' + version)
+    args = parser.parse_args()
+    if args.secure and (args.principal is None or args.keytab is None):
+        parser.error("if secure cluster, both of --principal and --keytab required")
+    if args.port is None and [host for host in args.hosts.split(',') if ':' not in host]:
+        parser.error("--port is required for hosts given without port")
+    try:
+        args.selectors = selectors(args.metric,args.config)
+    except (ValueError,configparser.Error) as e:
+        parser.error(str(e))
+    if not args.selectors:
+        parser.error("at least one --metric or a --config file is required")
+    return args
+
+"""
+Return [{'label','query','attribute','warning','critical','aggregate'}] from
+the command line metrics followed by the config file sections
+"""
+def selectors(metrics,config_file=None):
+    selected=[]
+    def add(label,query,attribute,warning=None,critical=None,aggregate='max'):
+        aggregate=aggregate or 'max'
+        if aggregate not in jmx.aggregates:
+            raise ValueError('unknown aggregate "%s" for %s' % (aggregate,label))
+        if label in [selector['label'] for selector in selected]:
+            raise ValueError('metric %s defined twice' % label)
+        selected.append({'label':label,'query':query,'attribute':attribute,
+            'warning':warning or None,'critical':critical or None,'aggregate':aggregate})
+    for metric in metrics:
+        fields=metric.split(';')
+        if len(fields) < 3 or len(fields) > 6:
+            raise ValueError('--metric must be LABEL;QUERY;ATTRIBUTE[;WARN[;CRIT[;AGGREGATE]]]')
+        add(*fields)
+    if config_file:
+        config=configparser.RawConfigParser()
+        if not config.read(config_file):
+            raise ValueError('unable to read %s' % config_file)
+        for section in config.sections():
+            options=dict(config.items(section))
+            if 'query' not in options or 'attribute' not in options:
+                raise ValueError('section %s needs query and attribute' % section)
+            add(section,options['query'],options['attribute'],options.get('warning'),options.get('critical'),options.get('aggregate','max'))
+    return selected
+
+class Jmx(nagiosplugin.Resource):
+    """
+    Every distinct query is requested once per host, all of them through one
+    pooled session at most workers at a time, and every selector is then
+    evaluated against the decoded beans
+    """
+    def __init__(self,args):
+        html_auth = None
+        if args.secure:
+            html_auth=HTTPKerberosAuth()
+            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file,args.reuse_cache)
+            os.environ['KRB5CCNAME'] = args.cache_file
+        self.hosts=[host if ':' in host else '%s:%d' % (host,args.port) for host in args.hosts.split(',')]
+        self.selectors=args.selectors
+        self.http=parallel.session(args.workers,html_auth)
+        self.http_timeout=args.http_timeout
+        queries=sorted(set([selector['query'] for selector in self.selectors]))
+        self.beans,self.errors=parallel.map_bounded(self.fetch,[(host,query) for host in self.hosts for query in queries],args.workers,args.deadline)
+        if args.secure and auth_token: auth_token.destroy()
+
+    def fetch(self,request):
+        host,query=request
+        return jmx.get_beans(self.http,host.split(':')[0],host.split(':')[1],query,self.http_timeout)
+
+    def probe(self):
+        metrics=[]
+        for host in self.hosts:
+            errors=sorted(set([error for (failed,query),error in self.errors.items() if failed == host]))
+            metrics.append(nagiosplugin.Metric('%s connection' % host,', '.join(errors) if errors else 'OK',context='connection'))
+            for selector in self.selectors:
+                if (host,selector['query']) not in self.beans:
+                    continue
+                value=jmx.select(self.beans[(host,selector['query'])],selector['attribute'],selector['aggregate'])
+                if isinstance(value,bool):
+                    value=int(value)
+                if not isinstance(value,numbers.Number):
+                    metrics.append(nagiosplugin.Metric('%s %s' % (host,selector['label']),'%s not found' % selector['attribute'] if value is None else 'not a number (%s)' % value,context='missing'))
+                    continue
+                metrics.append(nagiosplugin.Metric('%s %s' % (host,selector['label']),value,context=selector['label']))
+        return metrics
+
+@nagiosplugin.guarded
+def main():
+    args = parser()
+    check = nagiosplugin.Check(Jmx(args),
+        stringContext.StringContext('connection',
+            'OK'),
+        stringContext.StringContext('missing',
+            None,
+            level='warning',
+            fmt_metric='{name} is {value}'))
+    for selector in args.selectors:
+        check.add(nagiosplugin.ScalarContext(selector['label'],selector['warning'],selector['critical']))
+    check.main()
+
+if __name__ == '__main__':
+    main()
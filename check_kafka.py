@@ -21,18 +21,23 @@
 # AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
 
 import stringContext
+import kafkaState
 import nagiosplugin
 import argparse
 import subprocess
 import re
+from kazoo.client import KazooClient
 
 def parser():
     version="0.1"
     parser = argparse.ArgumentParser(description="Check zookeeper znodes existence and content")
     parser.add_argument('-H','--hosts',action='store',required=True)
     parser.add_argument('-K','--kafka_list_bin',action='store',default='/usr/lib/kafka/bin/kafka-list-topic.sh')
-    parser.add_argument('-T','--topic',action='store',required=True)
+    parser.add_argument('-T','--topic',action='store',help="Topic to check, comma separated topics or every topic with --backend zookeeper")
+    parser.add_argument('-b','--backend',action='store',choices=['script','zookeeper'],default='script',help="Run kafka-list-topic.sh or read the partitions state from zookeeper")
     args = parser.parse_args()
+    if args.backend == 'script' and args.topic is None:
+        parser.error("--topic is required with --backend script")
     return args
 
 class KafkaTopics(nagiosplugin.Resource):
@@ -51,12 +56,35 @@ class KafkaTopics(nagiosplugin.Resource):
         self.kafka_list_bin = args.kafka_list_bin
 	if args.topic:
 	    self.topic=args.topic
-        self.get_status()
+        if args.backend == 'zookeeper':
+            self.get_zookeeper_status(args.topic.split(',') if args.topic else None)
+        else:
+            self.get_status()
 
     def get_status(self):
         self.under_replicated=self.parse_topics('--under-replicated-partitions')[0]
         self.unavailable=self.parse_topics('--unavailable-partitions')[0]
 
+    """
+    Same result as get_status for any number of topics in one zookeeper
+    session. Partitions are written as TOPIC:PARTITION when more than one
+    topic is checked.
+    """
+    def get_zookeeper_status(self,topics):
+        zk = KazooClient(hosts=self.zkserver)
+        zk.start()
+        try:
+            brokers = kafkaState.get_brokers(zk)
+            partitions = kafkaState.get_partitions(zk,topics)
+        finally:
+            zk.stop()
+        def format(topic_partitions):
+            if len(partitions) == 1:
+                return ''.join(['%d ' % partition for topic,partition in topic_partitions])
+            return ''.join(['%s:%d ' % (topic,partition) for topic,partition in topic_partitions])
+        self.under_replicated=format(kafkaState.under_replicated(partitions))
+        self.unavailable=format(kafkaState.unavailable(partitions,brokers))
+
     def probe(self):
         yield nagiosplugin.Metric('under_replicated',self.under_replicated if self.under_replicated != "" else None,context="Under Replication")
         yield nagiosplugin.Metric('unavailable',self.unavailable if self.unavailable !="" else None,context="Unavailability")
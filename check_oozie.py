@@ -23,6 +23,7 @@
 import argparse
 import nagiosplugin
 import ooziestatus
+import stringContext
 
 def parser():
     version="0.1"
@@ -31,6 +32,7 @@ def parser():
     parser.add_argument('-s', '--secure',action='store_true')
     parser.add_argument('-k', '--keytab',action='store')
     parser.add_argument('--cache_file',action='store', default='/tmp/nagios.krb')
+    parser.add_argument('--reuse_cache',action='store_true',help="Keep the kerberos ticket cache between checks")
     parser.add_argument('-H','--host',action='store',default='localhost')
     parser.add_argument('-P','--port',action='store',type=int,default=14000)
     parser.add_argument('--coordinators',nargs="+", action='store')
@@ -39,9 +41,23 @@ def parser():
     parser.add_argument('-w','--warning', action='store', type=int, default=10)
     parser.add_argument('--log_file',action='store',default='nrpe/')
     parser.add_argument('--query_size',action='store',type=int,default=5)
+    parser.add_argument('--runtime_percentile',action='store',type=int,default=95,help="Percentile of the succeeded actions runtime checked against --runtime_warn and --runtime_crit")
+    parser.add_argument('--runtime_warn',action='store',type=int,default=None,help="Seconds")
+    parser.add_argument('--runtime_crit',action='store',type=int,default=None,help="Seconds")
+    parser.add_argument('--runtime_window',action='store',type=int,default=86400,help="Seconds of finished actions the runtime percentiles are taken over")
+    parser.add_argument('--runtime_bucket',action='store',type=int,default=3600,help="Seconds of finished actions kept in one runtime sketch of the actions cache")
+    parser.add_argument('--page_size',action='store',type=int,default=100,help="Coordinators requested per page")
+    parser.add_argument('--timeout',action='store',type=int,default=10,help="Seconds before the check is aborted")
+    parser.add_argument('--http_timeout',action='store',type=int,default=5,help="Seconds each oozie request may take, must stay below --timeout")
+    parser.add_argument('--workers',action='store',type=int,default=8,help="Coordinators whose actions are requested at the same time")
+    parser.add_argument('--actions_cache',action='store',default='/tmp/nagios_oozie_actions.json',help="File where final coordinator actions are kept between checks, empty to disable")
+    parser.add_argument('--actions_cache_ttl',action='store',type=int,default=86400,help="Seconds a vanished coordinator is kept in the actions cache")
+    parser.add_argument('--coordinator_status',action='store',default=','.join(ooziestatus.OozieStatus.active_status),help="Comma separated status of the coordinators to check")
     args = parser.parse_args()
     if args.secure and (args.principal is None or args.keytab is None):
         parser.error("if secure cluster, both of --principal and --keytab required")
+    if args.http_timeout >= args.timeout:
+        parser.error("--http_timeout must be below --timeout, a slow oozie would be killed by the check timeout instead of reported")
     return args
 
 class Oozie(nagiosplugin.Resource):
@@ -55,10 +71,23 @@ class Oozie(nagiosplugin.Resource):
         if args.keytab:
             params['keytab'] = args.keytab
 	params['cache_file'] = args.cache_file
+        params['reuse_cache'] = args.reuse_cache
 	params['log_file'] = args.log_file
         params['secure'] = args.secure
         params['query_size'] = args.query_size
+        params['page_size'] = args.page_size
+        params['workers'] = args.workers
+        params['timeout'] = args.http_timeout
+        # Leave a second to report the coordinators still waiting before the
+        # check timeout fires
+        params['deadline'] = args.timeout - 1
+        params['coordinator_status'] = args.coordinator_status.split(',')
+        params['actions_cache'] = args.actions_cache
+        params['actions_cache_ttl'] = args.actions_cache_ttl
+        params['runtime_window'] = args.runtime_window
+        params['runtime_bucket'] = args.runtime_bucket
         self.oozie_status=ooziestatus.OozieStatus(params)
+        self.runtime_percentile=args.runtime_percentile
         if args.coordinators is not None:
             self.coordinators=args.coordinators
         else:
@@ -67,17 +96,30 @@ class Oozie(nagiosplugin.Resource):
     def probe(self):
 	yield nagiosplugin.Metric('Running OozieServers', len(self.coordinators), context="coordinators")
         for coord in self.coordinators:
-            total = self.oozie_status.coordinators[coord]['total']
-            if self.oozie_status.coordinators[coord].get('SUCCEEDED'):
-                success =  float(self.oozie_status.coordinators[coord].get('SUCCEEDED').get('count')*100/total)
+            status = self.oozie_status.coordinators.get(coord)
+            if not status:
+                # Unknown coordinator or its actions could not be retrieved
+                yield nagiosplugin.Metric('Actions ' + coord, 'unavailable', context="actions")
+                continue
+            total = status['total']
+            if status.get('SUCCEEDED'):
+                success =  float(status.get('SUCCEEDED').get('count')*100/total)
             else:
                 success = 0.0
-            if self.oozie_status.coordinators[coord].get('WAITING'):
-                waiting =  float(self.oozie_status.coordinators[coord].get('WAITING').get('count')*100/total)
+            if status.get('WAITING'):
+                waiting =  float(status.get('WAITING').get('count')*100/total)
             else:
                 waiting = 0.0
             fails = 100.0 - success - waiting
             yield nagiosplugin.Metric('Fails ' + coord, fails ,context="errors") # - success - waiting,context="errors")
+            runtimes = self.oozie_status.runtimes.get(coord,{}).get('SUCCEEDED')
+            if runtimes:
+                for percentile in sorted(set([50,95,99,self.runtime_percentile])):
+                    yield nagiosplugin.Metric('p%d runtime %s' % (percentile,coord),
+                        round(runtimes.quantile(percentile/100.0),1),
+                        uom='s',
+                        min=0,
+                        context="runtime" if percentile == self.runtime_percentile else "runtime percentiles")
 
 @nagiosplugin.guarded
 def main():
@@ -89,8 +131,16 @@ def main():
             args.critical),
 	nagiosplugin.ScalarContext('coordinators',
 	    '1:',
-	    '1:'))
-    check.main()
+	    '1:'),
+        nagiosplugin.ScalarContext('runtime',
+            args.runtime_warn,
+            args.runtime_crit),
+        nagiosplugin.ScalarContext('runtime percentiles'),
+        stringContext.StringContext('actions',
+            'available',
+            level='unknown',
+            fmt_metric='{name} {value}'))
+    check.main(timeout=args.timeout)
 
 if __name__ == '__main__':
     main()
@@ -31,8 +31,25 @@ def parser():
     parser.add_argument('-n','--nimbus_serv',action='store',required=True)
     parser.add_argument('-p','--nimbus_port',action='store',type=int,default=6627)
     parser.add_argument('-t','--topology',action='store',default=None)
+    parser.add_argument('--workers',action='store',type=int,default=4,help="Connections to nimbus used at the same time")
+    parser.add_argument('--connect_timeout',action='store',type=int,default=2)
+    parser.add_argument('--read_timeout',action='store',type=int,default=5,help="Seconds, --connect_timeout plus --read_timeout must stay below --timeout")
+    parser.add_argument('--timeout',action='store',type=int,default=10)
+    parser.add_argument('--topology_cache',action='store',default='/tmp/nagios_storm_topologies.json',help="File where topology ids are kept between checks")
+    parser.add_argument('--capacity',action='store_true',help="Check the worker slots and supervisors of the cluster")
+    parser.add_argument('--supervisors',action='store',default='',help="Comma separated supervisors expected to be alive, on top of the ones seen by previous runs")
+    parser.add_argument('--supervisor_cache',action='store',default='/tmp/nagios_storm_supervisors.json',help="File where the supervisors seen by --capacity are kept between checks")
+    parser.add_argument('--supervisor_ttl',action='store',type=int,default=86400,help="Seconds a vanished supervisor is reported dead before it is forgotten")
+    parser.add_argument('--slots_used_warn',action='store',type=float,default=80)
+    parser.add_argument('--slots_used_crit',action='store',type=float,default=95)
+    parser.add_argument('--free_slots_warn',action='store',default=None,help="Range of free worker slots, e.g. 4:")
+    parser.add_argument('--free_slots_crit',action='store',default=None,help="Range of free worker slots, e.g. 1:")
+    parser.add_argument('--dead_supervisors_warn',action='store',default=None)
+    parser.add_argument('--dead_supervisors_crit',action='store',default='0')
     parser.add_argument('--latency_warn',action='store',type=int)
     parser.add_argument('--latency_crit',action='store',type=int)
+    parser.add_argument('--spout_failed_warn',action='store',type=float,help="Percentage of failed spout tuples in the last 10m")
+    parser.add_argument('--spout_failed_crit',action='store',type=float,help="Percentage of failed spout tuples in the last 10m")
     parser.add_argument('--load_1d_warn',action='store',type=float,default=0.80)
     parser.add_argument('--load_3h_warn',action='store',type=float,default=0.90)
     parser.add_argument('--load_10m_warn',action='store',type=float,default=0.95)
@@ -40,11 +57,27 @@ def parser():
     parser.add_argument('--load_3h_crit',action='store',type=float, default=0.97)
     parser.add_argument('--load_10m_crit',action='store',type=float, default=0.99)
     args = parser.parse_args()
+    if args.connect_timeout + args.read_timeout >= args.timeout:
+        parser.error("--connect_timeout plus --read_timeout must be below --timeout, a slow Nimbus would be killed by the check timeout instead of reported")
     return args
 
 class StormTopology(stormStatus.StormStatus,nagiosplugin.Resource):
+    def __init__(self,args):
+        stormStatus.StormStatus.__init__(self,args)
+        self.check_capacity=args.capacity
+        self.supervisors=[supervisor for supervisor in args.supervisors.split(',') if supervisor]
+
     def probe(self):    
 	yield nagiosplugin.Metric('Nimbus connected', self.nimbus_connected, context = 'connected')
+        if self.check_capacity and self.cluster is not None:
+            capacity = self.capacity(self.supervisors)
+            yield nagiosplugin.Metric('Slots used', round(capacity['used%'],2), uom='%', min=0, max=100, context='slots used')
+            yield nagiosplugin.Metric('Free slots', capacity['free'], min=0, max=capacity['slots'], context='free slots')
+            yield nagiosplugin.Metric('Full supervisors', capacity['full_supervisors'], min=0, context='cluster')
+            yield nagiosplugin.Metric('Dead supervisors', len(capacity['dead_supervisors']), min=0, context='dead supervisors')
+            yield nagiosplugin.Metric('Nimbus uptime', self.cluster['nimbus_uptime'], uom='s', min=0, context='cluster')
+            for host,free in sorted(capacity['free_per_supervisor'].items()):
+                yield nagiosplugin.Metric('Free slots %s' % host, free, min=0, context='cluster')
         for topology in self.topologies_to_check:
 	    yield nagiosplugin.Metric('Topology %s connected' % topology, 
 		self.topologies[topology]['connected'],
@@ -61,10 +94,23 @@ class StormTopology(stormStatus.StormStatus,nagiosplugin.Resource):
                         yield nagiosplugin.Metric('Load 10m %s-%s-%s' % (topology,component_key,status['id']),
                             status['stats']['load']['600'],
                             context='10m load')
+                if component_value['spouts']:
+                    summary = self.spoutSummary(topology,component_key)
+                    for window,label in [('600','10m'),('10800','3h'),('86400','1d')]:
+                        yield nagiosplugin.Metric('Spout latency %s %s-%s' % (label,topology,component_key),
+                            round(summary[window]['complete_ms_avg'],2),
+                            uom='ms',
+                            context='spout latency' if window == '600' else 'spout stats')
+                        yield nagiosplugin.Metric('Spout failed %s %s-%s' % (label,topology,component_key),
+                            round(summary[window]['failed%'],2),
+                            uom='%',
+                            context='spout failed' if window == '600' else 'spout stats')
+                        yield nagiosplugin.Metric('Spout throughput %s %s-%s' % (label,topology,component_key),
+                            round(summary[window]['throughput'],2),
+                            context='spout stats')
         
 @nagiosplugin.guarded
 def main():
-    timeout=10 # default
     args = parser()
     check = nagiosplugin.Check(StormTopology(args),
 	stringContext.StringContext('connected',
@@ -78,8 +124,28 @@ def main():
             args.load_3h_crit),
         nagiosplugin.ScalarContext('10m load',
             args.load_10m_warn,
-            args.load_10m_crit))
-    check.main(timeout=timeout)
+            args.load_10m_crit),
+        nagiosplugin.ScalarContext('spout latency',
+            args.latency_warn,
+            args.latency_crit),
+        nagiosplugin.ScalarContext('spout failed',
+            args.spout_failed_warn,
+            args.spout_failed_crit),
+        nagiosplugin.ScalarContext('spout stats'),
+        nagiosplugin.ScalarContext('slots used',
+            args.slots_used_warn,
+            args.slots_used_crit,
+            fmt_metric='{value}% worker slots in use'),
+        nagiosplugin.ScalarContext('free slots',
+            args.free_slots_warn,
+            args.free_slots_crit,
+            fmt_metric='{value} free worker slots'),
+        nagiosplugin.ScalarContext('dead supervisors',
+            args.dead_supervisors_warn,
+            args.dead_supervisors_crit,
+            fmt_metric='{value} dead supervisors'),
+        nagiosplugin.ScalarContext('cluster'))
+    check.main(timeout=args.timeout)
 
 if __name__ == '__main__':
     main()
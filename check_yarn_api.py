@@ -23,12 +23,19 @@
 from requests_kerberos import HTTPKerberosAuth
 import kerberosWrapper
 import stringContext
+import parallel
+import jmx
+import stats
 import os
+import re
 import argparse
 import requests
 import nagiosplugin
-import ast
+import json
 import socket
+import time
+import heapq
+from collections import defaultdict
 
 def parser():
     version="0.1"
@@ -37,8 +44,11 @@ def parser():
     parser.add_argument('-s', '--secure',action='store_true')
     parser.add_argument('-k', '--keytab',action='store')
     parser.add_argument('--cache_file',action='store', default='/tmp/nagios.krb')
+    parser.add_argument('--reuse_cache',action='store_true',help="Keep the kerberos ticket cache between checks")
     parser.add_argument('--rm',action='store',default='localhost')
     parser.add_argument('--port',action='store',type=int,default=8088)
+    parser.add_argument('--http_timeout',action='store',type=float,default=10)
+    parser.add_argument('--node_states',action='store',default=None,help="Comma separated node states requested to the RM, e.g. UNHEALTHY,LOST,REBOOTED. With --nm_sweep every node is requested and the states filtered locally")
     parser.add_argument('--alert',action='store',default='critical')
     parser.add_argument('-v','--version', action='version', version='%(prog)s ' + version)
     parser.add_argument('--lost_warn',action='store',default=1)
@@ -49,48 +59,196 @@ def parser():
     parser.add_argument('--rebooted_crit',action='store',default=2)
     parser.add_argument('--apps_warn',action='store',default=100)
     parser.add_argument('--apps_crit',action='store',default=500)
+    parser.add_argument('--aggregate_nodes',action='store_true',help="One metric per node state instead of one per node")
+    parser.add_argument('--top_nodes',action='store',type=int,default=10,help="Nodes listed with --aggregate_nodes and for each --nm_sweep metric")
+    parser.add_argument('--not_running_warn',action='store',default=None)
+    parser.add_argument('--not_running_crit',action='store',default='0')
+    parser.add_argument('--nm_sweep',action='store_true',help="Query /ws/v1/node/info and JMX of every running or unhealthy nodemanager")
+    parser.add_argument('--nm_workers',action='store',type=int,default=20,help="Nodemanager requests sent at the same time")
+    parser.add_argument('--nm_deadline',action='store',type=float,default=30,help="Seconds to wait for all nodemanagers")
+    parser.add_argument('--bad_dirs_warn',action='store',default='0',help="Nodemanagers with bad local or log dirs")
+    parser.add_argument('--bad_dirs_crit',action='store',default=None)
+    parser.add_argument('--dir_usage_warn',action='store',default='80',help="Disk use percent of the fullest good local or log dir")
+    parser.add_argument('--dir_usage_crit',action='store',default='90')
+    parser.add_argument('--nm_unhealthy_warn',action='store',default='0',help="Nodemanagers reporting themselves unhealthy")
+    parser.add_argument('--nm_unhealthy_crit',action='store',default=None)
+    parser.add_argument('--nm_unreachable_warn',action='store',default='5')
+    parser.add_argument('--nm_unreachable_crit',action='store',default='20')
+    parser.add_argument('--nm_cache',action='store',default='/tmp/nagios_yarn_nm.json',help="Where the GC time and failed containers counters of every nodemanager are kept between runs")
+    parser.add_argument('--nm_cache_ttl',action='store',type=int,default=86400,help="Seconds a vanished nodemanager is kept in the counters cache")
+    parser.add_argument('--gc_time_warn',action='store',default=None,help="Percent of the time since the previous run the nodemanager JVM spent in GC")
+    parser.add_argument('--gc_time_crit',action='store',default=None)
     args = parser.parse_args()
     if args.secure and (args.principal is None or args.keytab is None):
         parser.error("if secure cluster, both of --principal and --keytab required")
     return args
 
 class Resourcemanager(nagiosplugin.Resource):
+    state_severity={'LOST':0,'UNHEALTHY':1,'REBOOTED':2,'SHUTDOWN':3,'DECOMMISSIONING':4,'DECOMMISSIONED':5,'NEW':6}
+    api_url={
+        'clusterInfo':"/ws/v1/cluster",
+        'clusterMetrics':"/ws/v1/cluster/metrics",
+        'nodes':"/ws/v1/cluster/nodes"
+    }
+
+    def get(self,resource):
+        url = "http://" + self.rm + ':' + str(self.port) + self.api_url[resource]
+        params = {'states':self.node_states} if resource == 'nodes' and self.node_states and not self.sweep else None
+        response = self.http.get(url, params=params, timeout=self.http_timeout)
+        response.raise_for_status()
+        return json.loads(response.content)[resource]
+
     def status(self):
-        response = requests.get("http://" + self.rm + ':' + str(self.port) + "/ws/v1/cluster" , auth=self.html_auth)
-        if response.ok:
-            self.clusterinfo = ast.literal_eval(response.content)['clusterInfo']
+        results,errors = parallel.map_bounded(self.get,self.api_url.keys(),len(self.api_url),self.http_timeout)
+        if 'clusterInfo' in results:
+            self.clusterinfo = results['clusterInfo']
         else:
             self.clusterinfo['state']="ERROR"
 
-        response = requests.get("http://" + self.rm + ':' + str(self.port) + "/ws/v1/cluster/metrics" , auth=self.html_auth)
-        if response.ok:
-            self.clustermetrics = ast.literal_eval(response.content)['clusterMetrics']
+        if 'clusterMetrics' in results:
+            self.clustermetrics = results['clusterMetrics']
         else:
-            self.clustermetrics['unhealthyNodes']=0  
+            self.clustermetrics['unhealthyNodes']=0
             self.clustermetrics['lostNodes']=0
             self.clustermetrics['rebootedNodes']=0
             self.clustermetrics['appsPending']=0
-        response = requests.get("http://" + self.rm + ':' + str(self.port) + "/ws/v1/cluster/nodes" , auth=self.html_auth)
-        if response.ok:
-            self.clusternodes=ast.literal_eval(response.content)['nodes']['node']
+        # An empty node list is returned as {"nodes":null}
+        if results.get('nodes'):
+            self.allnodes=results['nodes']['node']
+            self.clusternodes=self.allnodes
+        # The sweep needs the running nodes, so the states are filtered here
+        if self.sweep and self.node_states:
+            states=self.node_states.upper().split(',')
+            self.clusternodes=[node for node in self.allnodes if node['state'] in states]
         # It is possible to request /schedulers but I didn't find any useful information for alerts
 
+    """
+    Count the nodes per state in one pass and keep the top_nodes not running
+    ones, worst states first
+    """
+    def aggregate_nodes(self):
+        self.node_states_count=defaultdict(int)
+        offending=[]
+        for node in self.clusternodes:
+            self.node_states_count[node['state']]+=1
+            if node['state'] != 'RUNNING':
+                offending.append((self.state_severity.get(node['state'],len(self.state_severity)),node['nodeHostName'],node['state']))
+        self.offending_nodes=[(host,state) for severity,host,state in heapq.nsmallest(self.top_nodes,offending)]
+
+    """
+    Return {FIELD:VALUE} of a nodemanager from /ws/v1/node/info or from its
+    Hadoop:service=NodeManager,name=* beans. Bad dirs are read from the
+    health report when the NodeManagerMetrics bean does not count them.
+    """
+    def nodemanager(self,request):
+        address,resource=request
+        values=dict()
+        if resource == 'info':
+            response = self.http.get("http://" + address + "/ws/v1/node/info", timeout=self.http_timeout)
+            response.raise_for_status()
+            info = json.loads(response.content)['nodeInfo']
+            values['Healthy']=info.get('nodeHealthy',True)
+            values['Bad dirs']=sum([int(bad) for bad in re.findall('(\d+)/\d+ (?:local|log)-dirs',info.get('healthReport',''))])
+            return values
+        host,port=address.split(':')
+        for bean in jmx.get_beans(self.http,host,port,'Hadoop:service=NodeManager,name=*',self.http_timeout):
+            if bean['name'].endswith('name=NodeManagerMetrics'):
+                values['Containers']=bean.get('ContainersRunning',0)
+                values['ContainersFailed']=bean.get('ContainersFailed',0)
+                if 'BadLocalDirs' in bean:
+                    values['Bad dirs']=bean['BadLocalDirs']+bean.get('BadLogDirs',0)
+                if 'GoodLocalDirsDiskUtilizationPerc' in bean:
+                    values['Dir usage']=max(bean['GoodLocalDirsDiskUtilizationPerc'],bean.get('GoodLogDirsDiskUtilizationPerc',0))
+            elif bean['name'].endswith('name=JvmMetrics'):
+                values['GcTimeMillis']=bean.get('GcTimeMillis',0)
+        return values
+
+    """
+    GcTimeMillis and ContainersFailed only grow while the nodemanager runs,
+    so they are turned into the percent of time spent in GC and the
+    containers failed since the previous run. The cache is
+    {HOST:{'time':TIMESTAMP,'GcTimeMillis':MS,'ContainersFailed':COUNT}}
+    and a host whose counters went back, restarted since, gets no value
+    until the next run.
+    """
+    def counter_deltas(self,nodes,now):
+        try:
+            with open(self.nm_cache) as cache:
+                previous=json.load(cache)
+        except (IOError,ValueError):
+            previous=dict()
+        for host,values in nodes.items():
+            if 'GcTimeMillis' not in values or 'ContainersFailed' not in values:
+                continue
+            last=previous.get(host)
+            if last and now > last['time'] and values['GcTimeMillis'] >= last['GcTimeMillis'] and values['ContainersFailed'] >= last['ContainersFailed']:
+                values['GC time']=round((values['GcTimeMillis']-last['GcTimeMillis'])/(now-last['time'])/10.0,2)
+                values['Failed containers']=values['ContainersFailed']-last['ContainersFailed']
+            previous[host]={'time':now,'GcTimeMillis':values['GcTimeMillis'],'ContainersFailed':values['ContainersFailed']}
+        if not self.nm_cache:
+            return
+        expire=now-self.nm_cache_ttl
+        try:
+            tmp_file = '%s.%d' % (self.nm_cache,os.getpid())
+            with open(tmp_file,'w') as tmp:
+                json.dump(dict((host,entry) for host,entry in previous.items() if entry['time'] > expire),tmp)
+            os.rename(tmp_file,self.nm_cache)
+        except (IOError,OSError):
+            pass
+
+    """
+    Query the info resource and the JMX of every nodemanager the RM lists as
+    RUNNING or UNHEALTHY, whatever node_states is, at the same time,
+    nm_workers requests at most, and keep cluster wide counts, percentiles
+    and the top_nodes worst nodes
+    """
+    def sweep_nodemanagers(self):
+        addresses=dict((node['nodeHTTPAddress'],node['nodeHostName']) for node in self.allnodes
+            if node['state'] in ('RUNNING','UNHEALTHY') and node.get('nodeHTTPAddress'))
+        results,errors = parallel.map_bounded(self.nodemanager,[(address,resource) for address in addresses for resource in ('info','jmx')],
+            self.nm_workers,self.nm_deadline)
+        nodes=dict()
+        for (address,resource),values in sorted(results.items()):
+            nodes.setdefault(addresses[address],dict()).update(values)
+        unreachable=set([addresses[address] for address,resource in errors])
+        self.counter_deltas(nodes,time.time())
+        self.nm_sweep={'Unhealthy':sorted([host for host,values in nodes.items() if not values.get('Healthy',True)]),
+            'Bad dirs':sorted([host for host,values in nodes.items() if values.get('Bad dirs')]),
+            'Unreachable':sorted(unreachable)}
+        for field in ['Dir usage','Containers','Failed containers','GC time']:
+            self.nm_sweep[field]=stats.summarize(dict((host,values[field]) for host,values in nodes.items() if field in values),self.top_nodes)
+
     def __init__(self,args):
 	self.html_auth = None
         if args.secure:
             self.html_auth=HTTPKerberosAuth()
-            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file)
+            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file,args.reuse_cache)
 	    os.environ['KRB5CCNAME'] = args.cache_file
 	if args.rm == 'localhost':
             self.rm=socket.getfqdn()
         else:
             self.rm=args.rm
         self.port=args.port
+        self.http_timeout=args.http_timeout
+        self.node_states=args.node_states
+        self.aggregate=args.aggregate_nodes
+        self.top_nodes=args.top_nodes
+        self.offending_nodes=[]
+        self.nm_workers=args.nm_workers
+        self.nm_deadline=args.nm_deadline
+        self.nm_cache=args.nm_cache
+        self.nm_cache_ttl=args.nm_cache_ttl
+        self.nm_sweep=None
+        self.sweep=args.nm_sweep
+        self.http=parallel.session(max(len(self.api_url),self.nm_workers if args.nm_sweep else 0),self.html_auth)
         
         self.clusterinfo=dict()
         self.clustermetrics=dict()
         self.clusternodes=[]
+        self.allnodes=[]
         self.status()
+        if args.nm_sweep:
+            self.sweep_nodemanagers()
 	if args.secure and auth_token: auth_token.destroy()
      
     def probe(self):
@@ -99,9 +257,40 @@ class Resourcemanager(nagiosplugin.Resource):
         yield nagiosplugin.Metric('Lost Nodes',self.clustermetrics['lostNodes'],context="lost")
         yield nagiosplugin.Metric('Rebooted Nodes',self.clustermetrics['rebootedNodes'],context="rebooted")
         yield nagiosplugin.Metric('Apps Pending',self.clustermetrics['appsPending'],context="appsPending")
+        if self.nm_sweep:
+            yield nagiosplugin.Metric('NM unhealthy',len(self.nm_sweep['Unhealthy']),min=0,context="nmUnhealthy")
+            yield nagiosplugin.Metric('NM bad dirs',len(self.nm_sweep['Bad dirs']),min=0,context="badDirs")
+            yield nagiosplugin.Metric('NM unreachable',len(self.nm_sweep['Unreachable']),min=0,context="nmUnreachable")
+            for field,metric,uom,context in [('Dir usage','NM dir usage','%','dirUsage'),('Containers','NM containers',None,'nmStats'),
+                    ('Failed containers','NM failed containers',None,'nmStats'),('GC time','NM GC time','%','gcTime')]:
+                # GC time and failed containers need a previous run to diff against
+                if not self.nm_sweep[field]['count']:
+                    continue
+                for stat in ['p50','p95','max']:
+                    yield nagiosplugin.Metric('%s %s' % (metric,stat),self.nm_sweep[field][stat],uom,min=0,context=context if stat == 'max' else "nmStats")
+        if self.aggregate:
+            self.aggregate_nodes()
+            for state,count in sorted(self.node_states_count.items()):
+                yield nagiosplugin.Metric('%s nodes' % state,count,min=0,context="nodeCount" if state == 'RUNNING' else "notRunning")
+            return
         for node in self.clusternodes:
             yield nagiosplugin.Metric(node['nodeHostName'],node['state'],context="nodeState")
 
+class ResourcemanagerSummary(nagiosplugin.Summary):
+    def verbose(self,results):
+        msgs = super(ResourcemanagerSummary,self).verbose(results)
+        resource = results[0].resource
+        if resource.offending_nodes:
+            msgs.append('worst nodes: ' + ', '.join(['%s %s' % node for node in resource.offending_nodes]))
+        if resource.nm_sweep:
+            for field in ['Unhealthy','Bad dirs','Unreachable']:
+                if resource.nm_sweep[field]:
+                    msgs.append('%s nodemanagers: %s' % (field.lower(),', '.join(resource.nm_sweep[field][:resource.top_nodes])))
+            for field in ['Dir usage','Containers','Failed containers','GC time']:
+                if resource.nm_sweep[field]['worst']:
+                    msgs.append('%s: %s' % (field.lower(),', '.join(['%s %s' % node for node in resource.nm_sweep[field]['worst']])))
+        return msgs
+
 @nagiosplugin.guarded
 def main():
     args = parser()
@@ -110,6 +299,11 @@ def main():
             'STARTED'),
         stringContext.StringContext('nodeState',
             'RUNNING'),
+        nagiosplugin.ScalarContext('nodeCount'),
+        nagiosplugin.ScalarContext('notRunning',
+            args.not_running_warn,
+            args.not_running_crit,
+            fmt_metric='{value} {name}'),
         nagiosplugin.ScalarContext('unhealthy',
             args.unhealthy_warn,
             args.unhealthy_crit),
@@ -121,7 +315,29 @@ def main():
             args.rebooted_crit),
         nagiosplugin.ScalarContext('appsPending',
             args.apps_warn,
-            args.apps_crit))
+            args.apps_crit),
+        nagiosplugin.ScalarContext('nmUnhealthy',
+            args.nm_unhealthy_warn,
+            args.nm_unhealthy_crit,
+            fmt_metric='{value} nodemanagers unhealthy'),
+        nagiosplugin.ScalarContext('badDirs',
+            args.bad_dirs_warn,
+            args.bad_dirs_crit,
+            fmt_metric='{value} nodemanagers with bad dirs'),
+        nagiosplugin.ScalarContext('nmUnreachable',
+            args.nm_unreachable_warn,
+            args.nm_unreachable_crit,
+            fmt_metric='{value} nodemanagers unreachable'),
+        nagiosplugin.ScalarContext('dirUsage',
+            args.dir_usage_warn,
+            args.dir_usage_crit,
+            fmt_metric='{value}% used in the fullest nodemanager dir'),
+        nagiosplugin.ScalarContext('gcTime',
+            args.gc_time_warn,
+            args.gc_time_crit,
+            fmt_metric='{value}% of the time in GC'),
+        nagiosplugin.ScalarContext('nmStats'),
+        ResourcemanagerSummary())
     check.main()
 
 if __name__ == '__main__':
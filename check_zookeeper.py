@@ -22,6 +22,7 @@
 
 import netcat
 import stringContext
+import time
 import re
 import argparse
 import nagiosplugin
@@ -34,16 +35,29 @@ def parser():
     parser.add_argument('-lw','--latency_warning',action='store',default=500)
     parser.add_argument('-lc','--latency_critical',action='store',default=1000)
     parser.add_argument('-v','--version', action='store', default="3.4.5")
+    parser.add_argument('--mntr',action='store_true',help="One mntr (srvr if refused) per server")
+    parser.add_argument('--timeout',action='store',type=float,default=5,help="Seconds to connect to and read from each server")
+    parser.add_argument('--deadline',action='store',type=float,help="Seconds to wait for every server with --mntr")
+    parser.add_argument('--observers',action='store',type=int,default=0,help="How many of the --hosts are observers, they neither vote nor count as followers")
+    parser.add_argument('--outstanding_warning',action='store',default='10')
+    parser.add_argument('--outstanding_critical',action='store',default='100')
+    parser.add_argument('--fds_warning',action='store',default='80',help="Percent of the file descriptors limit open")
+    parser.add_argument('--fds_critical',action='store',default='95')
+    parser.add_argument('--znodes_warning',action='store')
+    parser.add_argument('--znodes_critical',action='store')
+    parser.add_argument('--watches_warning',action='store')
+    parser.add_argument('--watches_critical',action='store')
     args = parser.parse_args()
+    if not 0 <= args.observers < len(args.hosts.split(',')):
+        parser.error("--observers must leave at least one voting server in --hosts")
     return args
 
 class Zookeeper(nagiosplugin.Resource):
     @staticmethod
-    def get_status(host,port):
+    def get_status(status):
         version=""
         latency=""
         mode=""
-        status = netcat.netcat(host,int(port),'stat')
         for line in status.splitlines():
             m = re.match('^Zookeeper version:\s*(?P<VERSION>.+)',line)
             if m:
@@ -56,20 +70,120 @@ class Zookeeper(nagiosplugin.Resource):
                 latency=int(m.group('AVG'))
         return version,mode,latency
 
-    def parse_status(self):
+    def parse_status(self,timeout):
         self.status=dict()
-        for entry in self.hosts:
-            host,port=entry.split(':')
+        requests=[(entry.split(':')[0],int(entry.split(':')[1]),command) for entry in self.hosts for command in ('ruok','isro','stat')]
+        answers=netcat.netcat_many(requests,timeout)[0]
+        for host,port,command in requests[::3]:
             self.status[host]=dict()
-            self.status[host]['ok']=True if netcat.netcat(host,int(port),'ruok') == 'imok' else False
-            self.status[host]['rw']=True if netcat.netcat(host,int(port),'isro') == 'rw' else False
-            self.status[host]['version'],self.status[host]['mode'],self.status[host]['latency']=Zookeeper.get_status(host,port)
+            self.status[host]['ok']=True if answers.get((host,port,'ruok')) == 'imok' else False
+            self.status[host]['rw']=True if answers.get((host,port,'isro')) == 'rw' else False
+            self.status[host]['version'],self.status[host]['mode'],self.status[host]['latency']=Zookeeper.get_status(answers.get((host,port,'stat'),''))
+
+    """
+    srvr answers the fields of mntr older servers know about, it is
+    translated to the mntr names
+    """
+    @staticmethod
+    def parse_srvr(srvr):
+        fields=dict()
+        for line in srvr.splitlines():
+            m = re.match('^Zookeeper version:\s*(?P<VERSION>.+)',line)
+            if m:
+                fields['zk_version'] = m.group('VERSION')
+            m = re.match('Latency min/avg/max:\s*\d+/(?P<AVG>\d+)/\d+',line)
+            if m:
+                fields['zk_avg_latency'] = m.group('AVG')
+            m = re.match('Outstanding:\s*(?P<OUTSTANDING>\d+)',line)
+            if m:
+                fields['zk_outstanding_requests'] = m.group('OUTSTANDING')
+            m = re.match('Node count:\s*(?P<NODES>\d+)',line)
+            if m:
+                fields['zk_znode_count'] = m.group('NODES')
+            m = re.match('Mode:\s(?P<MODE>.+)',line)
+            if m:
+                fields['zk_server_state'] = m.group('MODE')
+        return fields
+
+    """
+    Every server is asked at the same time, the ones refusing mntr are asked
+    srvr in a second round within what is left of the deadline
+    """
+    def parse_mntr(self,timeout,deadline):
+        self.mntr=dict()
+        self.errors=dict()
+        self.timings=dict()
+        start=time.time()
+        entries=dict(((entry.split(':')[0],int(entry.split(':')[1]),'mntr'),entry) for entry in self.hosts)
+        answers,errors,timings=netcat.netcat_many(entries.keys(),timeout,deadline)
+        fallback=dict()
+        for request,entry in entries.items():
+            self.timings[entry]=timings[request]
+            if request in errors:
+                self.errors[entry]=errors[request]
+                continue
+            fields=dict(line.split('\t',1) for line in answers[request].splitlines() if '\t' in line)
+            if 'zk_server_state' in fields:
+                self.mntr[entry]=fields
+            else:
+                fallback[request[0:2]+('srvr',)]=entry
+        if fallback:
+            answers,errors,timings=netcat.netcat_many(fallback.keys(),timeout,max(deadline-(time.time()-start),0) if deadline is not None else None)
+            for request,entry in fallback.items():
+                self.timings[entry]+=timings[request]
+                if request in errors:
+                    self.errors[entry]=errors[request]
+                else:
+                    self.mntr[entry]=Zookeeper.parse_srvr(answers[request])
+
+    def __init__(self,args):
+       self.hosts=args.hosts.split(",") 
+       self.use_mntr=args.mntr
+       if self.use_mntr:
+           self.parse_mntr(args.timeout,args.deadline)
+       else:
+           self.parse_status(args.timeout)
 
-    def __init__(self,hosts):
-       self.hosts=hosts.split(",") 
-       self.parse_status()
-     
     def probe(self):
+        if self.use_mntr:
+            return self.probe_mntr()
+        return self.probe_status()
+
+    def probe_mntr(self):
+        leader=0
+        follower=0
+        metrics=[]
+        for entry in self.hosts:
+            host=entry.split(':')[0]
+            if entry not in self.mntr:
+                metrics.append(nagiosplugin.Metric('%s running' % host,'%s' % self.errors[entry],context="running"))
+                continue
+            fields=self.mntr[entry]
+            metrics.append(nagiosplugin.Metric('%s response time' % host,self.timings[entry],uom='s',min=0,context="response time"))
+            mode=fields.get('zk_server_state','')
+            metrics.append(nagiosplugin.Metric('%s running' % host,mode != '',context="running"))
+            metrics.append(nagiosplugin.Metric('%s writable' % host,mode in ('leader','follower','observer','standalone'),context="writable"))
+            metrics.append(nagiosplugin.Metric('%s version' % host,fields.get('zk_version',''),context="version"))
+            metrics.append(nagiosplugin.Metric('%s latency' % host,int(fields.get('zk_avg_latency',0)),min=0,context="latency"))
+            if 'zk_outstanding_requests' in fields:
+                metrics.append(nagiosplugin.Metric('%s outstanding' % host,int(fields['zk_outstanding_requests']),min=0,context="outstanding"))
+            if 'zk_znode_count' in fields:
+                metrics.append(nagiosplugin.Metric('%s znodes' % host,int(fields['zk_znode_count']),min=0,context="znodes"))
+            if 'zk_watch_count' in fields:
+                metrics.append(nagiosplugin.Metric('%s watches' % host,int(fields['zk_watch_count']),min=0,context="watches"))
+            if int(fields.get('zk_max_file_descriptor_count',0)) > 0:
+                metrics.append(nagiosplugin.Metric('%s open fds' % host,
+                    int(fields['zk_open_file_descriptor_count'])*100.0/int(fields['zk_max_file_descriptor_count']),uom='%',min=0,max=100,context="open fds"))
+            if mode == 'leader':
+                leader+=1
+                if 'zk_synced_followers' in fields:
+                    metrics.append(nagiosplugin.Metric('%s synced followers' % host,int(fields['zk_synced_followers']),min=0,context="synced followers"))
+            elif mode == 'follower':
+                follower+=1
+        metrics.append(nagiosplugin.Metric('Mode','%d/%d' % (leader,follower), context="mode"))
+        return metrics
+
+    def probe_status(self):
         leader=0
         follower=0
         for host in self.hosts:
@@ -87,7 +201,9 @@ class Zookeeper(nagiosplugin.Resource):
 @nagiosplugin.guarded
 def main():
     args = parser()
-    check = nagiosplugin.Check(Zookeeper(args.hosts),
+    # The leader only syncs and counts the voting followers, not the observers
+    followers = len(args.hosts.split(',')) - args.observers - 1
+    check = nagiosplugin.Check(Zookeeper(args),
         stringContext.StringContext('running',
             True,
 	    fmt_metric='ZK Server running {value}'),
@@ -101,8 +217,23 @@ def main():
             args.latency_warning,
             args.latency_critical),
         stringContext.StringContext('mode',
-            '1/%d' % (len(args.hosts.split(',')) - 1),
-	    fmt_metric='leader/followers {value}'))
+            '1/%d' % followers,
+	    fmt_metric='leader/followers {value}'),
+        nagiosplugin.ScalarContext('outstanding',
+            args.outstanding_warning,
+            args.outstanding_critical),
+        nagiosplugin.ScalarContext('znodes',
+            args.znodes_warning,
+            args.znodes_critical),
+        nagiosplugin.ScalarContext('watches',
+            args.watches_warning,
+            args.watches_critical),
+        nagiosplugin.ScalarContext('open fds',
+            args.fds_warning,
+            args.fds_critical),
+        nagiosplugin.ScalarContext('response time'),
+        nagiosplugin.ScalarContext('synced followers',
+            critical='%d:' % followers))
     check.main()
 
 if __name__ == '__main__':
@@ -22,10 +22,10 @@
 
 import stringContext
 import kerberosWrapper
+import kafkaState
 import nagiosplugin
 import argparse
 import subprocess,os,re
-import ast
 from kazoo.client import KazooClient
 import kazoo
 
@@ -37,6 +37,7 @@ def parser():
     parser.add_argument('-p','--principal',action='store')
     parser.add_argument('-k','--keytab',action='store')
     parser.add_argument('-c','--cache_file',action='store',default='/tmp/nagios_zookeeper')
+    parser.add_argument('--reuse_cache',action='store_true',help="Keep the kerberos ticket cache between checks")
     parser.add_argument('-t','--test',action='store',required=True)
     parser.add_argument('-T','--topic',action='store')
     parser.add_argument('--hdfs_cluster_name',action='store')
@@ -45,14 +46,56 @@ def parser():
     parser.add_argument('--crit_topics',action='store',default='0:100')
     parser.add_argument('--warn_hosts',action='store',default='2:')
     parser.add_argument('--crit_hosts',action='store',default='1:')
+    parser.add_argument('--warn_leader_skew',action='store',default='20',help="Percent the broker with most leaders is over the mean")
+    parser.add_argument('--crit_leader_skew',action='store',default='50')
+    parser.add_argument('--warn_replica_skew',action='store',default='20',help="Percent the broker with most replicas is over the mean")
+    parser.add_argument('--crit_replica_skew',action='store',default='50')
+    parser.add_argument('--warn_out_of_sync',action='store',default='0',help="Replicas out of the ISR on the worst broker")
+    parser.add_argument('--crit_out_of_sync',action='store')
+    parser.add_argument('--warn_preferred_imbalance',action='store',default='10',help="Percent of the partitions of a broker not led by it as preferred replica")
+    parser.add_argument('--crit_preferred_imbalance',action='store',default='25')
+    parser.add_argument('--top_brokers',action='store',type=int,default=3,help="Worst brokers listed by the kafka_balance test")
+    parser.add_argument('--groups',action='store',help="Comma separated consumer groups for the kafka_lag test, every group by default")
+    parser.add_argument('--offsets_source',action='store',choices=sorted(kafkaState.log_end_sources.keys()),default='shell',help="Where the kafka_lag test reads log end offsets from")
+    parser.add_argument('--kafka_run_class',action='store',default='/usr/lib/kafka/bin/kafka-run-class.sh')
+    parser.add_argument('--offsets_workers',action='store',type=int,default=10,help="Topics whose log end offsets are read at the same time")
+    parser.add_argument('--offsets_deadline',action='store',type=float,help="Seconds to wait for every log end offset, 80%% of --timeout by default. GetOffsetShell processes still running are killed")
+    parser.add_argument('--warn_lag',action='store',default='1000',help="Messages behind the log end for a group and topic")
+    parser.add_argument('--crit_lag',action='store',default='10000')
+    parser.add_argument('--group_lag',action='append',default=[],metavar='GROUP[/TOPIC]=WARN,CRIT',help="Lag thresholds for a group or a topic of a group, can be repeated")
     parser.add_argument('-z','--zk_client',action='store',default='/usr/bin/zookeeper-client')
+    parser.add_argument('--max_in_flight',action='store',type=int,default=200,help="Zookeeper reads pipelined at the same time")
+    parser.add_argument('--timeout',action='store',type=int,help="10 seconds by default, 50 for kafka_lag, which starts a JVM per topic with the shell offsets source")
     args = parser.parse_args()
     if args.secure and (args.principal is None or args.keytab is None):
         parser.error('If secure cluster, both of --principal and --keytab required')
     if args.test == 'hdfs' and args.hdfs_cluster_name is None:
         parser.error('If checking hdfs --hdfs_cluster_ name is required')
+    if args.test == 'kafka_lag' and args.offsets_source == 'kafka-python' and kafkaState.KafkaConsumer is None:
+        parser.error('--offsets_source kafka-python requires the kafka-python package')
+    if args.timeout is None:
+        args.timeout=50 if args.test == 'kafka_lag' else 10
+    if args.offsets_deadline is None:
+        args.offsets_deadline=args.timeout*0.8
+    elif args.offsets_deadline >= args.timeout:
+        parser.error('--offsets_deadline must be below --timeout')
+    try:
+        args.lag_thresholds=lag_thresholds(args.group_lag)
+    except ValueError:
+        parser.error('--group_lag must be GROUP[/TOPIC]=WARN,CRIT')
     return args
 
+"""
+Parse --group_lag into {LAG_CONTEXT:(WARN,CRIT)}
+"""
+def lag_thresholds(group_lag):
+    thresholds=dict()
+    for threshold in group_lag:
+        name,ranges=threshold.rsplit('=',1)
+        warn,crit=ranges.split(',')
+        thresholds['lag ' + name]=(warn or None,crit or None)
+    return thresholds
+
 class ZookeeperZnode(nagiosplugin.Resource):
     def call_zk(self,cmd,url):
         print self.zk_client,'-server', self.zkserver, cmd, url
@@ -62,7 +105,7 @@ class ZookeeperZnode(nagiosplugin.Resource):
 
     def __init__(self,args):
         if args.secure:
-            auth_token = kerberosWrapper.krb_wrapper(args.principal, args.keytab,args.cache_file)
+            auth_token = kerberosWrapper.krb_wrapper(args.principal,args.keytab,args.cache_file,args.reuse_cache)
             os.environ['KRB5CCNAME'] = args.cache_file
         self.zkserver = args.hosts
         self.zk_client = args.zk_client
@@ -70,10 +113,22 @@ class ZookeeperZnode(nagiosplugin.Resource):
         self.hdfs_cluster_name=args.hdfs_cluster_name
         self.tests = {'hdfs' : self.check_hdfs,
                 'hbase' : self.check_hbase,
-                'kafka' : self.check_kafka
+                'kafka' : self.check_kafka,
+                'kafka_balance' : self.check_kafka_balance,
+                'kafka_lag' : self.check_kafka_lag
         }
         self.check_topics=args.check_topics
         self.topic=args.topic
+        self.max_in_flight=args.max_in_flight
+        self.top_brokers=args.top_brokers
+        self.worst_brokers=[]
+        self.offsets_errors=dict()
+        self.groups=args.groups.split(',') if args.groups else None
+        self.offsets_source=args.offsets_source
+        self.kafka_run_class=args.kafka_run_class
+        self.offsets_workers=args.offsets_workers
+        self.offsets_deadline=args.offsets_deadline
+        self.lag_thresholds=args.lag_thresholds
 	if args.secure and auth_token: auth_token.destroy()
         self.zk = KazooClient(hosts=self.zkserver)
         self.zk.start()
@@ -115,45 +170,102 @@ class ZookeeperZnode(nagiosplugin.Resource):
                     metrics.append(nagiosplugin.Metric('Topic %s partition %s in sync' % (k_topic, k_partition),all_sync,context='true'))
         return metrics
 
+    """
+    Index leaders, replicas, out of sync replicas and preferred leaders per
+    broker and report the skew between brokers, keeping only the
+    top_brokers worst ones for the long output: unregistered brokers, then
+    the most out of sync and misled replicas, then the most leaders
+    """
+    def check_kafka_balance(self):
+        brokers=kafkaState.get_brokers(self.zk,self.max_in_flight)
+        topics=[self.topic] if self.topic is not None else None
+        index=kafkaState.broker_index(kafkaState.get_partitions(self.zk,topics,self.max_in_flight),brokers)
+        imbalance=[0.0]
+        for broker,counts in index.items():
+            if counts['preferred']:
+                imbalance.append(counts['not_preferred']*100.0/counts['preferred'])
+        ranked=sorted(index.items(),key=lambda item: (item[0] not in brokers,item[1]['out_of_sync']+item[1]['not_preferred'],item[1]['leaders'],item[1]['replicas']),reverse=True)
+        self.worst_brokers=[(broker,counts,broker in brokers) for broker,counts in ranked[:self.top_brokers]]
+        return [nagiosplugin.Metric('Hosts',len(brokers),context='hosts'),
+            nagiosplugin.Metric('leader skew',kafkaState.skew(index,brokers,'leaders'),uom='%',context='leader skew'),
+            nagiosplugin.Metric('replica skew',kafkaState.skew(index,brokers,'replicas'),uom='%',context='replica skew'),
+            nagiosplugin.Metric('max out of sync',max([counts['out_of_sync'] for counts in index.values()] or [0]),min=0,context='out of sync'),
+            nagiosplugin.Metric('preferred leader imbalance',max(imbalance),uom='%',context='preferred imbalance')]
+
+    """
+    Committed offsets of every group are read level by level with pipelined
+    zookeeper reads and the log end offsets once per topic, then the lag is
+    summed by group and topic
+    """
+    def check_kafka_lag(self):
+        metrics=[]
+        offsets=kafkaState.get_consumer_offsets(self.zk,self.groups,self.max_in_flight)
+        partitions=dict()
+        for group,topics in offsets.items():
+            for topic,committed in topics.items():
+                if self.topic is None or topic == self.topic:
+                    partitions.setdefault(topic,set()).update(committed.keys())
+        log_end,self.offsets_errors=kafkaState.log_end_sources[self.offsets_source](partitions,kafkaState.get_brokers(self.zk,self.max_in_flight),
+            self.offsets_workers,self.offsets_deadline,self.kafka_run_class)
+        for (group,topic),lag in sorted(kafkaState.consumer_lag(offsets,log_end).items()):
+            context='lag %s/%s' % (group,topic)
+            if context not in self.lag_thresholds:
+                context='lag %s' % group if 'lag %s' % group in self.lag_thresholds else 'lag'
+            metrics.append(nagiosplugin.Metric('%s/%s lag' % (group,topic),lag,min=0,context=context))
+        metrics.append(nagiosplugin.Metric('Consumer groups',len(offsets),min=0,context='consumer groups'))
+        metrics.append(nagiosplugin.Metric('Topics without log end offsets',len(self.offsets_errors),min=0,context='offsets unavailable'))
+        return metrics
+
     def get_kafka_state(self):
-        ids_parsed=dict()
         topics_parsed=dict()
-        #output,err=self.call_zk('ls','/brokers/ids')
-        #output,err=self.call_zk('ls','/')
-        #if err is None or err is "":
-        #    ids=ast.literal_eval(output)
-        ids = self.zk.get_children('/brokers/ids')
-        for host in ids:
-            ids_parsed[str(host)]=ast.literal_eval(self.zk.get('/brokers/ids/%d' % int(host))[0])
+        ids_parsed=dict((str(broker),registration) for broker,registration in kafkaState.get_brokers(self.zk,self.max_in_flight).items())
         if self.zk.exists('/brokers/topics') is not None:
             if self.topic is not None:
                 topics=[self.topic]
             else:
                 topics=self.zk.get_children('/brokers/topics')
-            for topic in topics:
-                topics_parsed[str(topic)]=dict()
-                if self.check_topics:
-                    aux=self.zk.get('/brokers/topics/%s' % str(topic))[0]
-                    topic_stat=ast.literal_eval(aux)
-                    topics_parsed[str(topic)]['partitions']=topic_stat['partitions']
-                    topics_parsed[str(topic)]['isr']=dict()
-                    for partition in topics_parsed[topic]['partitions'].keys():
-                        output=ast.literal_eval(self.zk.get('/brokers/topics/%s/partitions/%s/state' % (topic,partition))[0])
-                        topics_parsed[str(topic)]['isr'][partition]=output['isr']
+            if self.check_topics:
+                for topic,partitions in kafkaState.get_partitions(self.zk,topics,self.max_in_flight).items():
+                    topics_parsed[str(topic)]={'partitions':{},'isr':{}}
+                    for partition,state in partitions.items():
+                        topics_parsed[str(topic)]['partitions'][partition]=state['replicas']
+                        topics_parsed[str(topic)]['isr'][partition]=state['isr']
+            else:
+                for topic in topics:
+                    topics_parsed[str(topic)]=dict()
         return topics_parsed,ids_parsed
         
+class ZookeeperZnodeSummary(nagiosplugin.Summary):
+    def verbose(self,results):
+        msgs = super(ZookeeperZnodeSummary,self).verbose(results)
+        resource = results[0].resource
+        if resource.worst_brokers:
+            msgs.append('worst brokers: ' + ', '.join(['%s%s (leaders=%d replicas=%d out_of_sync=%d not_preferred=%d)' %
+                (broker,'' if registered else ' unregistered',counts['leaders'],counts['replicas'],counts['out_of_sync'],counts['not_preferred'])
+                for broker,counts,registered in resource.worst_brokers]))
+        if resource.offsets_errors:
+            msgs.append('log end offsets unavailable: ' + ', '.join(['%s (%s)' % error for error in sorted(resource.offsets_errors.items())]))
+        return msgs
+
 @nagiosplugin.guarded
 def main():
-    timeout=10 # default
     args = parser()
     check = nagiosplugin.Check(ZookeeperZnode(args),
         stringContext.StringContext('true',True),
         stringContext.StringContext('false',False),
         nagiosplugin.ScalarContext('total_topics',args.warn_topics,args.crit_topics),
-        nagiosplugin.ScalarContext('hosts',args.warn_hosts,args.crit_hosts))
-    if args.test == "kafka":
-        timeout=0
-    check.main(timeout=timeout)
+        nagiosplugin.ScalarContext('hosts',args.warn_hosts,args.crit_hosts),
+        nagiosplugin.ScalarContext('leader skew',args.warn_leader_skew,args.crit_leader_skew),
+        nagiosplugin.ScalarContext('replica skew',args.warn_replica_skew,args.crit_replica_skew),
+        nagiosplugin.ScalarContext('out of sync',args.warn_out_of_sync,args.crit_out_of_sync),
+        nagiosplugin.ScalarContext('preferred imbalance',args.warn_preferred_imbalance,args.crit_preferred_imbalance),
+        nagiosplugin.ScalarContext('lag',args.warn_lag,args.crit_lag),
+        nagiosplugin.ScalarContext('offsets unavailable','0'),
+        nagiosplugin.ScalarContext('consumer groups'),
+        ZookeeperZnodeSummary())
+    for context,(warn,crit) in args.lag_thresholds.items():
+        check.add(nagiosplugin.ScalarContext(context,warn,crit))
+    check.main(timeout=args.timeout)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+try:
+    import ConfigParser as configparser
+except ImportError:
+    import configparser
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+import argparse
+import errno
+import logging
+import os
+import select
+import shlex
+import signal
+import socket
+import sys
+import time
+
+UNKNOWN = 3
+
+def parser():
+    version="0.1"
+    parser = argparse.ArgumentParser(description="Keeps nagios-hadoop checks warm and serves their last result over a unix socket")
+    parser.add_argument('-c','--config',action='store',default='/etc/nagios/collector.cfg')
+    parser.add_argument('--log_file',action='store',default=None)
+    parser.add_argument('-v','--version', action='version', version='%(prog)s ' + version)
+    args = parser.parse_args()
+    return args
+
+class CollectorHandler(socketserver.StreamRequestHandler):
+    """
+    Protocol: the client sends the check name followed by a newline and
+    receives "<exitcode> <timestamp>\\n<plugin output>". Requests are
+    answered from the collector main loop, timeout bounds a stuck client.
+    """
+    timeout = 2
+
+    def handle(self):
+        name = self.rfile.readline().strip()
+        if isinstance(name, bytes):
+            name = name.decode('utf-8')
+        exitcode,timestamp,output = self.server.collector.result(name)
+        response = '%d %d\n%s' % (exitcode,timestamp,output)
+        self.wfile.write(response.encode('utf-8'))
+
+class CollectorServer(socketserver.UnixStreamServer):
+    pass
+
+class Collector:
+    """
+    Every configured check is a check_*.py module imported once at startup.
+    Each refresh forks the warm interpreter and runs the module's main() in
+    the child, so nagiosplugin runtime state, timeouts and leaked clients die
+    with the child. What stays warm are the imports and, for the checks run
+    with --reuse_cache, the kerberos ticket cache: the resource, its http
+    sessions and connections are still built again on every refresh.
+    The daemon has a single thread, the socket is served from the same
+    select loop that reads the children, so fork never copies a lock held
+    by another thread.
+    """
+    def __init__(self,config_file):
+        config = configparser.RawConfigParser()
+        if not config.read(config_file):
+            raise IOError('Unable to read %s' % config_file)
+        self.socket_path = self.option(config,'collector','socket','/var/run/nagios-hadoop/collector.sock')
+        self.socket_mode = int(self.option(config,'collector','socket_mode','0660'),8)
+        self.max_running = int(self.option(config,'collector','max_running',4))
+        interval = int(self.option(config,'collector','interval',60))
+        timeout = int(self.option(config,'collector','timeout',50))
+        self.checks = dict()
+        for name in config.sections():
+            if name == 'collector':
+                continue
+            module = config.get(name,'module')
+            self.checks[name] = {
+                'module':__import__(module),
+                'argv':[module + '.py'] + shlex.split(self.option(config,name,'args','')),
+                'interval':int(self.option(config,name,'interval',interval)),
+                'timeout':int(self.option(config,name,'timeout',timeout)),
+                'next':0}
+        self.results = dict()
+        self.running = dict()
+        self.server = None
+        self.stopped = False
+
+    @staticmethod
+    def option(config,section,option,default):
+        if config.has_option(section,option):
+            return config.get(section,option)
+        return default
+
+    def result(self,name):
+        if name not in self.checks:
+            return UNKNOWN,0,'UNKNOWN: check %s is not configured in the collector\n' % name
+        return self.results.get(name,(UNKNOWN,0,'UNKNOWN: no result collected yet for %s\n' % name))
+
+    def spawn(self,name):
+        check = self.checks[name]
+        rfd,wfd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Only stdout may stay open on the pipe, a leftover grandchild
+            # holding another end would keep the refresh running
+            os.close(rfd)
+            for sibling in self.running:
+                os.close(sibling)
+            self.server.socket.close()
+            os.dup2(wfd,1)
+            os.close(wfd)
+            exitcode = UNKNOWN
+            try:
+                sys.argv = check['argv']
+                check['module'].main()
+            except SystemExit as e:
+                exitcode = e.code if isinstance(e.code,int) else UNKNOWN
+            except BaseException as e:
+                sys.stdout.write('UNKNOWN: %s\n' % e)
+            finally:
+                sys.stdout.flush()
+                os._exit(exitcode)
+        os.close(wfd)
+        self.running[rfd] = {'name':name,'pid':pid,'output':[],'started':time.time()}
+        check['next'] = time.time() + check['interval']
+
+    def drain(self,rfd):
+        while select.select([rfd],[],[],0)[0]:
+            data = os.read(rfd,65536)
+            if not data:
+                break
+            self.running[rfd]['output'].append(data)
+
+    def reap(self,rfd,killed=False,status=None):
+        child = self.running.pop(rfd)
+        os.close(rfd)
+        if killed:
+            try:
+                os.kill(child['pid'],signal.SIGKILL)
+            except OSError:
+                pass
+        if status is None:
+            status = os.waitpid(child['pid'],0)[1]
+        if killed:
+            exitcode,output = UNKNOWN,'UNKNOWN: Timeout: check execution aborted after %ds\n' % self.checks[child['name']]['timeout']
+        else:
+            exitcode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else UNKNOWN
+            output = b''.join(child['output']).decode('utf-8','replace')
+        self.results[child['name']] = (exitcode,int(time.time()),output)
+        logging.debug('%s refreshed with exit code %d' % (child['name'],exitcode))
+
+    def schedule(self):
+        now = time.time()
+        busy = set(child['name'] for child in self.running.values())
+        for name in sorted(self.checks, key=lambda name: self.checks[name]['next']):
+            if len(self.running) >= self.max_running:
+                break
+            if name not in busy and self.checks[name]['next'] <= now:
+                self.spawn(name)
+
+    def poll(self):
+        now = time.time()
+        for rfd,child in list(self.running.items()):
+            if now - child['started'] > self.checks[child['name']]['timeout']:
+                logging.warning('%s killed after %ds' % (child['name'],self.checks[child['name']]['timeout']))
+                self.reap(rfd,killed=True)
+                continue
+            # A grandchild still holding stdout delays the end of the pipe,
+            # so a child that already exited is reaped with what it wrote
+            pid,status = os.waitpid(child['pid'],os.WNOHANG)
+            if pid:
+                self.drain(rfd)
+                self.reap(rfd,status=status)
+        try:
+            readable = select.select(list(self.running.keys()) + [self.server.fileno()],[],[],1.0)[0]
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            return
+        for rfd in readable:
+            if rfd == self.server.fileno():
+                self.server.handle_request()
+                continue
+            data = os.read(rfd,65536)
+            if data:
+                self.running[rfd]['output'].append(data)
+            else:
+                self.reap(rfd)
+
+    def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = CollectorServer(self.socket_path,CollectorHandler)
+        server.collector = self
+        os.chmod(self.socket_path,self.socket_mode)
+        return server
+
+    def stop(self,signum,frame):
+        self.stopped = True
+
+    def run(self):
+        self.server = self.serve()
+        signal.signal(signal.SIGTERM,self.stop)
+        signal.signal(signal.SIGINT,self.stop)
+        try:
+            while not self.stopped:
+                self.schedule()
+                self.poll()
+        finally:
+            for rfd in list(self.running.keys()):
+                self.reap(rfd,killed=True)
+            self.server.server_close()
+            os.remove(self.socket_path)
+
+def main():
+    args = parser()
+    logging.basicConfig(filename=args.log_file,level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s')
+    Collector(args.config).run()
+
+if __name__ == '__main__':
+    main()
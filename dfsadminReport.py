@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+import re
+
+# Only the fields used by check_hadoop_hdfs are matched, every other line of
+# the report is rejected by the first characters of the pattern
+REPORT_FIELD = re.compile('^(?P<FIELD>Name|DFS Used%|Under replicated blocks|Missing blocks|Blocks with corrupt replicas)\s*:\s*(?P<VALUE>.*?)(\s*\((?P<HUMAN>.+)\))?$')
+SECTION = re.compile('^(?P<SECTION>Live|Dead|Decommissioning) datanodes\s+\((?P<VALUE>.+?)\)')
+
+class DatanodeRecord(object):
+    """
+    Compact per datanode entry of the report. It is indexed like the dicts
+    it replaces, e.g. record['DFS Used%'] or record['blockscanner'].
+    Section is the part of the report the datanode was listed in: 'Live',
+    'Dead' or 'Decommissioning'.
+    """
+    __slots__ = ('name','section','used','blockscanner')
+    fields = {'Name':'name','Section':'section','DFS Used%':'used','blockscanner':'blockscanner'}
+
+    def __init__(self,name,section=None):
+        self.name = name
+        self.section = section
+        self.used = None
+        self.blockscanner = None
+
+    def __getitem__(self,field):
+        return getattr(self,self.fields[field])
+
+    def __setitem__(self,field,value):
+        setattr(self,self.fields[field],value)
+
+"""
+Parse the output of 'hdfs dfsadmin -report' line by line from any iterable,
+e.g. the stdout pipe of the process, and return the structure:
+{'Total':{FIELD<<String>>:VALUE<<String>>}, DATANODE<<String>>:DatanodeRecord}
+where DATANODE is the datanode FQDN and the Total FIELD could be:
+    'Blocks with corrupt replicas'
+    'Datanodes available'
+    'DFS Used%'
+    'Missing blocks'
+    'Under replicated blocks'
+Use live_datanodes to leave out the dead and decommissioning ones.
+"""
+def parse(lines):
+    hdfsreport = dict()
+    total = hdfsreport['Total'] = dict()
+    record = total
+    section = None
+    for line in lines:
+        m = REPORT_FIELD.match(line)
+        if m:
+            field = m.group('FIELD')
+            if field == 'Name':
+                record = DatanodeRecord(m.group('VALUE'),section)
+                hdfsreport[m.group('HUMAN')] = record
+            else:
+                record[field] = m.group('VALUE')
+            continue
+        m = SECTION.match(line)
+        if m:
+            section = m.group('SECTION')
+            if section == 'Live':
+                total['Datanodes available'] = m.group('VALUE')
+    return hdfsreport
+
+def live_datanodes(hdfsreport):
+    return [datanode for datanode,record in hdfsreport.items() if datanode != 'Total' and record['Section'] == 'Live']
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+try:
+    import simplejson as json
+    assert json
+except ImportError:
+    import json
+
+import requests
+
+# The JMX json servlet of every Hadoop daemon accepts a JMX ObjectName pattern
+# in qry, so only the matching beans are serialized, e.g.
+#     Hadoop:service=NameNode,name=FSNamesystem
+#     Hadoop:service=JournalNode,name=Journal-*
+
+# Errors are raised as IOError with a short reason, e.g. "ConnectionError" or
+# "HTTP 503", since the requests messages are too long for a status line
+
+def get_beans(http,host,port,query=None,timeout=None):
+    params = {'qry':query} if query else None
+    try:
+        response = http.get("http://" + host + ":" + str(port) + "/jmx", params=params, timeout=timeout)
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        raise IOError('HTTP %d' % e.response.status_code)
+    except requests.exceptions.RequestException as e:
+        raise IOError(type(e).__name__)
+    return json.loads(response.content)['beans']
+
+"""
+Follow a dotted attribute path into a bean, e.g. "RpcQueueTimeAvgTime" or
+"LiveNodes.dn1:50010.usedSpace". Numeric steps index lists and string
+values holding json (as NameNodeInfo's LiveNodes) are decoded on the way.
+Attributes whose name has dots, like tag.HAState, are matched first.
+Return None when the path does not exist.
+"""
+def get_path(bean,path):
+    if path in bean:
+        return bean[path]
+    value = bean
+    for step in path.split('.'):
+        if isinstance(value,basestring):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                return None
+        if isinstance(value,dict):
+            value = value.get(step)
+        elif isinstance(value,list) and step.isdigit() and int(step) < len(value):
+            value = value[int(step)]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+aggregates = {
+    'max': max,
+    'min': min,
+    'sum': sum,
+    'avg': lambda values: float(sum(values))/len(values),
+    'count': len,
+}
+
+"""
+Aggregate the attribute path over every bean matching a query pattern.
+Return None when no bean has it.
+"""
+def select(beans,path,aggregate='max'):
+    values = [value for value in [get_path(bean,path) for bean in beans] if value is not None]
+    if not values:
+        return None
+    return aggregates[aggregate](values)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+try:
+    import simplejson as json
+    assert json
+except ImportError:
+    import json
+
+try:
+    from kafka import KafkaConsumer,TopicPartition
+except ImportError:
+    KafkaConsumer = None
+
+from collections import deque
+from kazoo.exceptions import NoNodeError
+import parallel
+import subprocess
+import threading
+
+"""
+Read many znodes of a started KazooClient keeping at most max_in_flight
+requests pipelined on the session. Return {PATH:DATA}, or {PATH:[CHILD]}
+with children=True. Paths that do not exist are left out.
+"""
+def get_many(zk,paths,max_in_flight=200,children=False):
+    results=dict()
+    pending=deque()
+    def collect():
+        path,result=pending.popleft()
+        try:
+            results[path]=result.get() if children else result.get()[0]
+        except NoNodeError:
+            pass
+    for path in paths:
+        if len(pending) >= max_in_flight:
+            collect()
+        pending.append((path,zk.get_children_async(path) if children else zk.get_async(path)))
+    while pending:
+        collect()
+    return results
+
+"""
+Read the Kafka 0.8 cluster state registered in zookeeper.
+Return {BROKER_ID<<int>>:REGISTRATION<<dict>>}
+"""
+def get_brokers(zk,max_in_flight=200):
+    paths=['/brokers/ids/%s' % broker for broker in zk.get_children('/brokers/ids')]
+    return dict((int(path.rsplit('/',1)[1]),json.loads(data)) for path,data in get_many(zk,paths,max_in_flight).items())
+
+"""
+Return {TOPIC:{PARTITION<<int>>:{'replicas':[BROKER_ID],'leader':BROKER_ID,'isr':[BROKER_ID]}}}
+for the given topics, or every topic if None. A partition without state
+znode gets leader -1 and an empty isr, as kafka-list-topic.sh does.
+"""
+def get_partitions(zk,topics=None,max_in_flight=200):
+    state=dict()
+    if zk.exists('/brokers/topics') is None:
+        return state
+    if topics is None:
+        topics=zk.get_children('/brokers/topics')
+    assignments=get_many(zk,['/brokers/topics/%s' % topic for topic in topics],max_in_flight)
+    paths=[]
+    for topic in topics:
+        state[topic]=dict()
+        if '/brokers/topics/%s' % topic not in assignments:
+            continue
+        for partition,replicas in json.loads(assignments['/brokers/topics/%s' % topic])['partitions'].items():
+            state[topic][int(partition)]={'replicas':replicas,'leader':-1,'isr':[]}
+            paths.append((topic,int(partition),'/brokers/topics/%s/partitions/%s/state' % (topic,partition)))
+    states=get_many(zk,[path for topic,partition,path in paths],max_in_flight)
+    for topic,partition,path in paths:
+        if path in states:
+            partition_state=json.loads(states[path])
+            state[topic][partition]['leader']=partition_state['leader']
+            state[topic][partition]['isr']=partition_state['isr']
+    return state
+
+def under_replicated(partitions):
+    return [(topic,partition) for topic in sorted(partitions) for partition,state in sorted(partitions[topic].items())
+        if len(state['isr']) < len(state['replicas'])]
+
+def unavailable(partitions,brokers):
+    return [(topic,partition) for topic in sorted(partitions) for partition,state in sorted(partitions[topic].items())
+        if state['leader'] not in brokers]
+
+"""
+Index the partition state by broker in one pass.
+Return {BROKER_ID:{'leaders','replicas','out_of_sync','preferred','not_preferred'}}
+for every registered broker and every broker still named in an assignment.
+'preferred' counts the partitions whose first replica is the broker and
+'not_preferred' the ones of those led by another broker.
+"""
+def broker_index(partitions,brokers):
+    index=dict((broker,{'leaders':0,'replicas':0,'out_of_sync':0,'preferred':0,'not_preferred':0}) for broker in brokers)
+    def entry(broker):
+        if broker not in index:
+            index[broker]={'leaders':0,'replicas':0,'out_of_sync':0,'preferred':0,'not_preferred':0}
+        return index[broker]
+    for topic in partitions.values():
+        for state in topic.values():
+            if state['leader'] >= 0:
+                entry(state['leader'])['leaders']+=1
+            for replica in state['replicas']:
+                entry(replica)['replicas']+=1
+                if replica not in state['isr']:
+                    entry(replica)['out_of_sync']+=1
+            if state['replicas']:
+                preferred=entry(state['replicas'][0])
+                preferred['preferred']+=1
+                if state['leader'] != state['replicas'][0]:
+                    preferred['not_preferred']+=1
+    return index
+
+"""
+Percentage the busiest of the given brokers is above their mean for field.
+"""
+def skew(index,brokers,field):
+    counts=[index[broker][field] for broker in brokers]
+    if not counts or not sum(counts):
+        return 0.0
+    mean=float(sum(counts))/len(counts)
+    return (max(counts)-mean)*100/mean
+
+"""
+Read the offsets committed in zookeeper by the high level consumers of the
+given groups, or every group if None, one level of the tree at a time.
+Return {GROUP:{TOPIC:{PARTITION<<int>>:OFFSET<<int>>}}}
+"""
+def get_consumer_offsets(zk,groups=None,max_in_flight=200):
+    offsets=dict()
+    if zk.exists('/consumers') is None:
+        return offsets
+    if groups is None:
+        groups=zk.get_children('/consumers')
+    group_topics=get_many(zk,['/consumers/%s/offsets' % group for group in groups],max_in_flight,children=True)
+    topic_partitions=get_many(zk,['%s/%s' % (path,topic) for path,topics in group_topics.items() for topic in topics],max_in_flight,children=True)
+    committed=get_many(zk,['%s/%s' % (path,partition) for path,partitions in topic_partitions.items() for partition in partitions],max_in_flight)
+    for path,offset in committed.items():
+        group,topic,partition=[path.split('/')[field] for field in (2,4,5)]
+        offsets.setdefault(group,dict()).setdefault(topic,dict())[int(partition)]=int(offset)
+    return offsets
+
+"""
+Log end offsets sources. Each one takes {TOPIC:[PARTITION]} and the broker
+registrations and returns two dicts {TOPIC:{PARTITION:OFFSET}} and
+{TOPIC:ERROR} like parallel.map_bounded.
+The shell source kills the GetOffsetShell processes still running at the
+deadline and starts no new ones after it.
+"""
+def shell_log_end_offsets(partitions,brokers,workers=10,deadline=None,run_class='/usr/lib/kafka/bin/kafka-run-class.sh'):
+    broker_list=','.join(['%s:%d' % (registration['host'],registration['port']) for registration in brokers.values()])
+    lock=threading.Lock()
+    processes=[]
+    expired=[]
+    def topic_offsets(topic):
+        with lock:
+            if expired:
+                raise RuntimeError('deadline exceeded')
+            response=subprocess.Popen([run_class,'kafka.tools.GetOffsetShell','--broker-list',broker_list,'--topic',topic,'--time','-1'],
+                stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+            processes.append(response)
+        output,err=response.communicate()
+        offsets=dict()
+        for line in output.splitlines():
+            fields=line.rsplit(':',2)
+            if len(fields) == 3 and fields[0] == topic and fields[2].isdigit():
+                offsets[int(fields[1])]=int(fields[2])
+        if not offsets:
+            raise RuntimeError(err.strip() or 'no offsets returned')
+        return offsets
+    results,errors=parallel.map_bounded(topic_offsets,partitions.keys(),workers,deadline)
+    with lock:
+        expired.append(True)
+        for response in processes:
+            if response.poll() is None:
+                response.kill()
+    return results,errors
+
+def client_log_end_offsets(partitions,brokers,workers=10,deadline=None,run_class=None):
+    if KafkaConsumer is None:
+        raise RuntimeError('kafka-python is not installed')
+    consumer=KafkaConsumer(bootstrap_servers=['%s:%d' % (registration['host'],registration['port']) for registration in brokers.values()],
+        enable_auto_commit=False)
+    try:
+        ends=consumer.end_offsets([TopicPartition(topic,partition) for topic in partitions for partition in partitions[topic]])
+    finally:
+        consumer.close()
+    offsets=dict()
+    for topic_partition,offset in ends.items():
+        offsets.setdefault(topic_partition.topic,dict())[topic_partition.partition]=offset
+    return offsets,dict((topic,'no offsets returned') for topic in partitions if topic not in offsets)
+
+log_end_sources={'shell':shell_log_end_offsets,'kafka-python':client_log_end_offsets}
+
+"""
+Sum the lag of every partition committed by each group.
+Return {(GROUP,TOPIC):LAG}, leaving out topics without log end offsets.
+"""
+def consumer_lag(offsets,log_end):
+    lag=dict()
+    for group,topics in offsets.items():
+        for topic,committed in topics.items():
+            if topic not in log_end:
+                continue
+            lag[(group,topic)]=sum([max(log_end[topic][partition]-offset,0) for partition,offset in committed.items()
+                if partition in log_end[topic]])
+    return lag
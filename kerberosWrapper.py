@@ -21,23 +21,37 @@
 # AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
 
 import krbV
+import fcntl
 import os
+import time
 
 class krb_wrapper():
-    def __init__(self,principal,keytab,ccache_file=None):
+    """
+    With reuse=True the ticket cache is shared between checks: a new ticket is
+    only requested when the cached one expires in less than min_lifetime
+    seconds, and destroy() leaves the cache in place for the next check.
+    """
+    def __init__(self,principal,keytab,ccache_file=None,reuse=False,min_lifetime=300):
         self.context = krbV.default_context()
         self.principal = krbV.Principal(name=principal, context=self.context)
         self.keytab = krbV.Keytab(name=keytab, context=self.context)
         self.ccache_file = ccache_file
+        self.reuse = reuse
+        self.min_lifetime = min_lifetime
         if ccache_file:
             self.ccache_file = ccache_file
             self.ccache = krbV.CCache(name="FILE:" + self.ccache_file, context=self.context, primary_principal=self.principal)
         else:
             self.ccache = self.context.default_ccache(primary_principal=self.principal)
-        self.ccache.init(self.principal)
-        self.ccache.init_creds_keytab(keytab=self.keytab,principal=self.principal)
+        if self.reuse:
+            self.renew()
+        else:
+            self.ccache.init(self.principal)
+            self.ccache.init_creds_keytab(keytab=self.keytab,principal=self.principal)
 
     def destroy(self):
+        if self.reuse:
+            return
         if self.ccache_file:
             os.system('kdestroy -c %s 2>/dev/null' % self.ccache_file)
         else:
@@ -46,3 +60,41 @@ class krb_wrapper():
     def reload(self):
         self.ccache.init(self.principal)
         self.ccache.init_creds_keytab(keytab=self.keytab,principal=self.principal)
+
+    def lifetime(self):
+        realm = self.principal.realm
+        tgt = krbV.Principal(name='krbtgt/%s@%s' % (realm,realm), context=self.context)
+        # krbV credentials are (client,server,(enctype,key),(authtime,starttime,
+        # endtime,renew_till),is_skey,ticket_flags,addresses,ticket,
+        # second_ticket,authdata)
+        creds = (self.principal,tgt,(0,None),(0,0,0,0),None,None,None,None,None,None)
+        try:
+            times = self.ccache.get_credentials(creds,krbV.KRB5_GC_CACHED,0)[3]
+            authtime,starttime,endtime,renew_till = times
+        except krbV.Krb5Error:
+            return 0
+        return endtime - time.time()
+
+    def renew(self):
+        if self.lifetime() > self.min_lifetime:
+            return
+        lock = open((self.ccache_file or '/tmp/krb5cc_%d' % os.getuid()) + '.lock','a')
+        try:
+            fcntl.flock(lock,fcntl.LOCK_EX)
+            # Another check may have renewed the ticket while we were waiting
+            if self.lifetime() > self.min_lifetime:
+                return
+            if self.ccache_file:
+                # Build the new cache aside and rename it, so concurrent
+                # checks never read a half written cache
+                tmp_file = '%s.%d' % (self.ccache_file,os.getpid())
+                tmp_ccache = krbV.CCache(name="FILE:" + tmp_file, context=self.context, primary_principal=self.principal)
+                tmp_ccache.init(self.principal)
+                tmp_ccache.init_creds_keytab(keytab=self.keytab,principal=self.principal)
+                os.rename(tmp_file,self.ccache_file)
+                self.ccache = krbV.CCache(name="FILE:" + self.ccache_file, context=self.context, primary_principal=self.principal)
+            else:
+                self.reload()
+        finally:
+            fcntl.flock(lock,fcntl.LOCK_UN)
+            lock.close()
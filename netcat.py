@@ -20,19 +20,96 @@
 #
 # AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
 
+import errno
+import os
+import select
 import socket
+import time
 
-def netcat(hostname, port, content):
-    data = "" 
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.connect((hostname, port))
-    s.sendall(content)
-    s.shutdown(socket.SHUT_WR)
-    while 1:
-        buff = s.recv(1024)
-        if buff == "":
-            break
+def netcat(hostname, port, content, timeout=None):
+    request = (hostname, port, content)
+    results,errors,timings = netcat_many([request],timeout)
+    if request in errors:
+        raise socket.error(errors[request])
+    return results[request]
+
+def netcat_many(requests, timeout=None, deadline=None, buffer_size=4096):
+    """
+    Send every (hostname, port, content) request at the same time, each on
+    its own non blocking connection, and read the answer until the server
+    closes the connection. A connection is given up after timeout seconds
+    and every one after deadline seconds. Return three dicts
+    {request:answer}, {request:error message} and {request:seconds}.
+    """
+    start = time.time()
+    connections = dict()
+    results = dict()
+    errors = dict()
+    timings = dict()
+
+    def close(fd, error=None):
+        connection = connections.pop(fd)
+        connection['socket'].close()
+        if error is None:
+            results[connection['request']] = bytes(connection['buffer'][:connection['size']])
         else:
-            data += buff
-    s.close()
-    return data
+            errors[connection['request']] = error
+        timings[connection['request']] = time.time() - start
+
+    for request in requests:
+        hostname, port, content = request
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setblocking(0)
+        ends = [start + limit for limit in (timeout, deadline) if limit is not None]
+        connections[s.fileno()] = {'socket': s, 'request': request, 'content': content, 'sent': 0,
+            'buffer': bytearray(buffer_size), 'size': 0, 'end': min(ends) if ends else None}
+        try:
+            code = s.connect_ex((hostname, port))
+        except socket.error as e:
+            close(s.fileno(), str(e))
+            continue
+        if code not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            close(s.fileno(), os_error(code))
+
+    while connections:
+        now = time.time()
+        for fd, connection in list(connections.items()):
+            if connection['end'] is not None and now >= connection['end']:
+                close(fd, 'timed out')
+        if not connections:
+            break
+        ends = [connection['end'] for connection in connections.values() if connection['end'] is not None]
+        writing = [fd for fd, connection in connections.items() if connection['sent'] < len(connection['content'])]
+        reading = [fd for fd in connections if fd not in writing]
+        readable, writable, _ = select.select(reading, writing, [], max(min(ends) - now, 0) if ends else None)
+        for fd in writable:
+            connection = connections[fd]
+            s = connection['socket']
+            try:
+                code = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if code:
+                    close(fd, os_error(code))
+                    continue
+                connection['sent'] += s.send(connection['content'][connection['sent']:])
+                if connection['sent'] == len(connection['content']):
+                    s.shutdown(socket.SHUT_WR)
+            except socket.error as e:
+                close(fd, str(e))
+        for fd in readable:
+            connection = connections[fd]
+            if connection['size'] == len(connection['buffer']):
+                connection['buffer'].extend(bytearray(len(connection['buffer'])))
+            try:
+                read = connection['socket'].recv_into(memoryview(connection['buffer'])[connection['size']:])
+            except socket.error as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    close(fd, str(e))
+                continue
+            if read == 0:
+                close(fd)
+            else:
+                connection['size'] += read
+    return results,errors,timings
+
+def os_error(code):
+    return '[Errno %d] %s' % (code, os.strerror(code))
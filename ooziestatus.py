@@ -30,8 +30,12 @@ except ImportError:
 
 from requests_kerberos import HTTPKerberosAuth
 import kerberosWrapper
+import parallel
+import quantileSketch
 from collections import defaultdict
 import time
+# time.strptime imports _strptime on first use, which fails in threads on python 2
+import _strptime
 
 import requests
 import os
@@ -40,11 +44,18 @@ import logging
 
 class OozieStatus:
     api_url={
-        'list_coordinators':"/oozie/v2/jobs?jobtype=coordinator",
+        'list_coordinators':"/oozie/v2/jobs?jobtype=coordinator&offset=%d&len=%d",
         'actions_from_coordinator':"/oozie/v2/job/%s?offset=%d&len=%d"
     }
+    # Coordinators in any other status (SUCCEEDED, KILLED, FAILED, DONEWITHERROR,
+    # IGNORED) will not materialize new actions
+    active_status=['PREP','RUNNING','RUNNINGWITHERROR','PREPSUSPENDED','SUSPENDED',
+        'SUSPENDEDWITHERROR','PREPPAUSED','PAUSED','PAUSEDWITHERROR']
+    # Actions in these status will not change anymore, so they are cached
+    final_action_status=['SUCCEEDED','KILLED','FAILED','TIMEDOUT','SKIPPED','IGNORED']
 
     def __init__(self,params):
+        self.started = time.time()
 	self.log_file = params.get('log_file','ganglia.') 	
 	logging.basicConfig(filename='/var/log/' + self.log_file + 'oozie.log',level=logging.DEBUG)
         self.host = params.get('host','localhost')
@@ -52,61 +63,164 @@ class OozieStatus:
         self.secure = params.get('secure',False)
         self.html_auth=None
         self.query_size = params.get('query_size',50)
+        self.page_size = params.get('page_size',100)
+        self.workers = params.get('workers',8)
+        self.timeout = params.get('timeout',30)
+        self.deadline = params.get('deadline')
+        self.coordinator_status = params.get('coordinator_status',self.active_status)
+        self.actions_cache = params.get('actions_cache')
+        self.actions_cache_ttl = params.get('actions_cache_ttl',86400)
+        self.runtime_window = params.get('runtime_window',86400)
+        self.runtime_bucket = params.get('runtime_bucket',3600)
 
         if self.secure:
             self.principal = params.get('principal')
             self.keytab = params.get('keytab')
             self.cache_file = params.get('cache_file','/tmp/oozie_gmond.cc')
+            self.reuse_cache = params.get('reuse_cache',False)
             self.html_auth=HTTPKerberosAuth()
-            auth_token = kerberosWrapper.krb_wrapper(self.principal,self.keytab,self.cache_file)
+            auth_token = kerberosWrapper.krb_wrapper(self.principal,self.keytab,self.cache_file,self.reuse_cache)
             os.environ['KRB5CCNAME'] = self.cache_file
+        self.http = parallel.session(self.workers,self.html_auth)
+        self.cache = self.load_cache()
+        self.runtimes = dict()
         self.coordinators = self.get_coordinators()
+        self.save_cache()
         if self.secure and auth_token: auth_token.destroy()
 
     def get_coordinators(self):
-        coordinators = {}
+        coordinators = []
+        offset = 1
+        status_filter = ';'.join(['status=' + status for status in self.coordinator_status])
         try:
-            url = "http://" + self.host + ":" + str(self.port) + self.api_url['list_coordinators']
-            response = requests.get(url, auth=self.html_auth)
-            if not response.ok:
-                return {}
-            for coordinator in json.loads(response.content)['coordinatorjobs']:
-                coordinators[coordinator['coordJobId']]=self.get_actions(coordinator['coordJobId'])
+            while 1:
+                url = "http://" + self.host + ":" + str(self.port) + self.api_url['list_coordinators'] % (offset,self.page_size)
+                response = self.http.get(url, params={'filter':status_filter}, timeout=self.timeout)
+                if not response.ok:
+                    return {}
+                page = json.loads(response.content)
+                coordinators.extend([coordinator['coordJobId'] for coordinator in page['coordinatorjobs']])
+                offset += len(page['coordinatorjobs'])
+                if not page['coordinatorjobs'] or offset > page['total']:
+                    break
         except:
             logging.error('http request error: "%s"' % url)
             return {}
-        return coordinators
+        # The deadline counts from the start of the check, kerberos and the
+        # coordinator listing included
+        deadline = None
+        if self.deadline is not None:
+            deadline = max(self.deadline-(time.time()-self.started),0)
+        # get_actions parses the action times with time.strptime in the worker
+        # threads, which is why _strptime is imported at the top of the module
+        results,errors = parallel.map_bounded(self.get_actions,coordinators,self.workers,deadline)
+        for coordinator,error in errors.items():
+            logging.error('coordinator "%s" actions not retrieved: %s' % (coordinator,error))
+            results[coordinator] = {}
+        return results
 
+    """
+    Return the status statistics of the last query_size actions of the
+    coordinator. Actions already cached in a final status are not requested
+    again, only the ones after the first missing or still running action.
+    The runtime of every action reaching a final status is added once to the
+    quantile sketch of the runtime_bucket seconds it finished in. Buckets
+    older than runtime_window are dropped and the rest merged into
+    runtimes[coordinator][status].
+    """
     def get_actions(self,coordinator):
         accumulator=dict()
         accumulator['total']=0
         try:
             url = "http://" + self.host + ":" + str(self.port) + self.api_url['actions_from_coordinator'] % (coordinator,0,0)
-            response = requests.get(url, auth=self.html_auth)
+            response = self.http.get(url, timeout=self.timeout)
             if not response.ok:
                 return {}
             total_actions=json.loads(response.content)['total']
 
-            url = "http://" + self.host + ":" + str(self.port) + self.api_url['actions_from_coordinator'] % (coordinator,total_actions-self.query_size,self.query_size)
-            response = requests.get(url, auth=self.html_auth)
-            if not response.ok:
-                return {}
+            first = max(total_actions-self.query_size+1,1)
+            cached = self.cache.get(coordinator,{}).get('actions',{})
+            now = time.time()
+            runtimes = self.load_runtimes(self.cache.get(coordinator,{}).get('runtimes',{}),now)
+            actions = dict()
+            for number in range(first,total_actions+1):
+                if str(number) not in cached or cached[str(number)][0] not in self.final_action_status:
+                    break
+                actions[number] = cached[str(number)]
+            else:
+                number = total_actions+1
 
-            actions = json.loads(response.content)['actions']
+            if number <= total_actions:
+                url = "http://" + self.host + ":" + str(self.port) + self.api_url['actions_from_coordinator'] % (coordinator,number,total_actions-number+1)
+                response = self.http.get(url, timeout=self.timeout)
+                if not response.ok:
+                    return {}
+                for position,action in enumerate(json.loads(response.content)['actions']):
+                    created=time.mktime(self.time_conversion(action['createdTime']))
+                    modified=time.mktime(self.time_conversion(action['lastModifiedTime']))
+                    action_number = action.get('actionNumber',number+position)
+                    actions[action_number] = [action['status'],modified-created]
+                    if action['status'] in self.final_action_status and cached.get(str(action_number),[None])[0] not in self.final_action_status \
+                        and modified > now - self.runtime_window:
+                        bucket = int(modified // self.runtime_bucket * self.runtime_bucket)
+                        runtimes.setdefault(action['status'],dict()).setdefault(bucket,quantileSketch.QuantileSketch()).add(modified-created)
 
-            for action in actions:
-                created=time.mktime(self.time_conversion(action['createdTime']))
-                modified=time.mktime(self.time_conversion(action['lastModifiedTime']))
-                runtime=modified-created
-                if accumulator.get(action['status']) is None:
-                    accumulator[action['status']]=defaultdict(int)
-                accumulator[action['status']]['count']+=1
-                accumulator[action['status']]['runtime']+=runtime
+            for status,runtime in actions.values():
+                if accumulator.get(status) is None:
+                    accumulator[status]=defaultdict(int)
+                accumulator[status]['count']+=1
+                accumulator[status]['runtime']+=runtime
                 accumulator['total']+=1
+            self.cache[coordinator] = {'seen':now,'actions':dict((str(number),action) for number,action in actions.items()),
+                'runtimes':dict((status,dict((str(bucket),sketch.to_dict()) for bucket,sketch in buckets.items())) for status,buckets in runtimes.items())}
+            self.runtimes[coordinator] = dict()
+            for status,buckets in runtimes.items():
+                for sketch in buckets.values():
+                    self.runtimes[coordinator].setdefault(status,quantileSketch.QuantileSketch()).merge(sketch)
         except:
             logging.error('http request error: "%s"' % url)
             return {} 
         return accumulator
         
+    """
+    Return {STATUS:{BUCKET_START:QuantileSketch}} of the cached runtimes,
+    leaving out the buckets fully before the runtime window
+    """
+    def load_runtimes(self,cached,now):
+        runtimes = dict()
+        for status,buckets in cached.items():
+            for bucket,sketch in buckets.items():
+                if int(bucket) + self.runtime_bucket > now - self.runtime_window:
+                    runtimes.setdefault(status,dict())[int(bucket)] = quantileSketch.QuantileSketch.from_dict(sketch)
+        return runtimes
+
+    """
+    The actions cache is a json file with the format
+    {COORDINATOR:{'seen':TIMESTAMP,'actions':{ACTION_NUMBER:[STATUS,RUNTIME]},
+        'runtimes':{STATUS:{BUCKET_START:QuantileSketch.to_dict()}}}}
+    Coordinators not seen in actions_cache_ttl seconds are evicted on save.
+    """
+    def load_cache(self):
+        if not self.actions_cache:
+            return {}
+        try:
+            with open(self.actions_cache) as cache:
+                return json.load(cache)
+        except (IOError,ValueError):
+            return {}
+
+    def save_cache(self):
+        if not self.actions_cache:
+            return
+        expire = time.time() - self.actions_cache_ttl
+        cache = dict((coordinator,entry) for coordinator,entry in self.cache.items() if entry['seen'] > expire)
+        try:
+            tmp_file = '%s.%d' % (self.actions_cache,os.getpid())
+            with open(tmp_file,'w') as tmp:
+                json.dump(cache,tmp)
+            os.rename(tmp_file,self.actions_cache)
+        except (IOError,OSError) as e:
+            logging.error('unable to save actions cache "%s": %s' % (self.actions_cache,e))
+
     def time_conversion(self,time_str):
         return time.strptime(str(time_str),'%a, %d %b %Y %H:%M:%S %Z')
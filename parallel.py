@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import threading
+import time
+import requests
+
+def session(pool_size=10,auth=None):
+    """
+    Return a keep-alive requests.Session whose connection pool can hold one
+    connection per worker thread.
+    """
+    http = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,pool_maxsize=pool_size)
+    http.mount('http://',adapter)
+    http.mount('https://',adapter)
+    http.auth = auth
+    return http
+
+def map_bounded(func,items,workers=10,deadline=None):
+    """
+    Call func(item) for every item with at most workers threads running at
+    the same time. Return two dicts {item:result} and {item:error message}.
+    Items not finished after deadline seconds are reported as errors; their
+    threads are left running as daemons so a hung host never blocks the check.
+    """
+    items = list(items)
+    pending = queue.Queue()
+    for item in items:
+        pending.put(item)
+    done = queue.Queue()
+
+    def worker():
+        while 1:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                done.put((item,True,func(item)))
+            except Exception as e:
+                done.put((item,False,str(e)))
+
+    threads = []
+    for i in range(min(workers,len(items))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    results = dict()
+    errors = dict()
+    end = time.time() + deadline if deadline is not None else None
+    for i in range(len(items)):
+        try:
+            if end is None:
+                item,ok,value = done.get()
+            else:
+                item,ok,value = done.get(timeout=max(end - time.time(),0))
+        except queue.Empty:
+            break
+        if ok:
+            results[item] = value
+        else:
+            errors[item] = value
+    else:
+        # Every item is done, let the workers see the empty queue and exit
+        for thread in threads:
+            thread.join()
+    for item in items:
+        if item not in results and item not in errors:
+            errors[item] = 'deadline exceeded'
+    return results,errors
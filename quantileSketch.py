@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+import math
+
+class QuantileSketch:
+    """
+    Streaming quantile estimator with fixed memory. Values are counted in
+    logarithmic buckets, so every quantile is returned with a relative error
+    below relative_accuracy. At most max_bins buckets are kept, the lowest
+    ones are collapsed when the limit is reached so high quantiles stay
+    accurate. Two sketches with the same relative_accuracy are merged by
+    adding their bucket counts.
+    """
+    def __init__(self,relative_accuracy=0.02,max_bins=256):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = dict()
+        self.zeros = 0
+        self.count = 0
+
+    def add(self,value,count=1):
+        if value <= 0:
+            self.zeros += count
+        else:
+            index = int(math.ceil(math.log(value) / self.log_gamma))
+            self.bins[index] = self.bins.get(index,0) + count
+            if len(self.bins) > self.max_bins:
+                self.collapse()
+        self.count += count
+
+    def merge(self,other):
+        for index,count in other.bins.items():
+            self.bins[index] = self.bins.get(index,0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self.collapse()
+
+    def collapse(self):
+        indexes = sorted(self.bins.keys())
+        lowest = indexes[-self.max_bins]
+        for index in indexes[:-self.max_bins]:
+            self.bins[lowest] += self.bins.pop(index)
+
+    def quantile(self,q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index in sorted(self.bins.keys()):
+            seen += self.bins[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins.keys()) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {'relative_accuracy':self.relative_accuracy,'max_bins':self.max_bins,
+            'zeros':self.zeros,'bins':dict((str(index),count) for index,count in self.bins.items())}
+
+    @classmethod
+    def from_dict(cls,data):
+        sketch = cls(data['relative_accuracy'],data['max_bins'])
+        sketch.zeros = data['zeros']
+        sketch.bins = dict((int(index),count) for index,count in data['bins'].items())
+        sketch.count = sketch.zeros + sum(sketch.bins.values())
+        return sketch
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+"""
+Exact nearest rank percentile of a sorted list, for the small per host
+samples of a single run
+"""
+def percentile(values,q):
+    if not values:
+        return 0
+    return values[min(int(len(values)*q/100.0),len(values)-1)]
+
+"""
+Return {'count','p50','p95','max','worst':[(HOST,VALUE)]} of {HOST:VALUE},
+worst holding the top hosts with the highest values. Without values count
+is 0 and the rest are only placeholders.
+"""
+def summarize(values,top=3):
+    ranked=sorted([(value,host) for host,value in values.items()],reverse=True)
+    ordered=[value for value,host in reversed(ranked)]
+    return {'count':len(ordered),'p50':percentile(ordered,50),'p95':percentile(ordered,95),'max':ordered[-1] if ordered else 0,
+        'worst':[(host,value) for value,host in ranked[:top]]}
@@ -29,64 +29,207 @@ from storm import Nimbus
 from storm.ttypes import *
 from storm.constants import *
 
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from contextlib import contextmanager
+from array import array
+import threading
+import socket
+import json
+import os
+import time
+import parallel
+
+
+class NimbusPool:
+    """
+    Up to size framed thrift connections to one Nimbus, reused by every call
+    of the check. A Nimbus.Client is not thread safe, so each thread takes
+    its own connection from the pool. Connections that fail are discarded.
+    """
+    def __init__(self,host,port,size=1,connect_timeout=5,read_timeout=30):
+        self.host=host
+        self.port=port
+        self.connect_timeout=connect_timeout
+        self.read_timeout=read_timeout
+        self.idle=queue.Queue()
+        self.slots=threading.Semaphore(size)
+
+    def connect(self):
+        tsocket     = TSocket.TSocket(self.host,self.port)
+        transport   = TTransport.TFramedTransport(tsocket)
+        protocol    = TBinaryProtocol.TBinaryProtocol(transport)
+        client      = Nimbus.Client(protocol)
+
+        tsocket.setTimeout(self.connect_timeout*1000)
+        transport.open()
+        tsocket.setTimeout(self.read_timeout*1000)
+        return transport,client
+
+    @contextmanager
+    def client(self):
+        self.slots.acquire()
+        try:
+            try:
+                transport,client = self.idle.get_nowait()
+            except queue.Empty:
+                transport,client = self.connect()
+            try:
+                yield client
+            except:
+                transport.close()
+                raise
+            self.idle.put((transport,client))
+        finally:
+            self.slots.release()
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait()[0].close()
 
 class StormStatus:
+    # Each spout executor is stored as one array of doubles indexed by
+    # spout_windows.index(window)*len(spout_fields)+spout_fields.index(field)
+    spout_windows=['600','10800','86400']
+    spout_fields=['acked','failed','complete_ms_avg','emitted']
+
     def __init__(self,args):
 	self.nimbus_connected = False
+        started=time.time()
         self.nimbus_serv=args.nimbus_serv
         self.nimbus_port=args.nimbus_port
         self.topology=args.topology
+        self.topology_cache=args.topology_cache
+        self.supervisor_cache=args.supervisor_cache
+        self.supervisor_ttl=args.supervisor_ttl
         self.topologies=dict()
-        self.get_topologies()
+        self.cluster=None
+        self.known_supervisors=dict()
+        self.pool=NimbusPool(self.nimbus_serv,self.nimbus_port,args.workers,args.connect_timeout,args.read_timeout)
+        if self.topology is None or args.capacity or not self.load_topology_id():
+            self.get_topologies()
+        if args.capacity and self.cluster is not None:
+            self.known_supervisors=self.track_supervisors(time.time())
         if self.topology is not None:
             self.topologies_to_check=[self.topology]
         else:
             self.topologies_to_check=self.topologies.keys()
-        for topology in self.topologies_to_check:
-            self.get_topology_status(topology)
+        # Leave a second to report the topologies still waiting as not
+        # connected before the check timeout fires
+        deadline=max(args.timeout-1-(time.time()-started),0)
+        results,errors=parallel.map_bounded(self.get_topology_status,[topology for topology in self.topologies_to_check if topology in self.topologies],args.workers,deadline)
+        for topology,components in results.items():
+            if components is not None:
+                self.topologies[topology]['components']=components
+                self.topologies[topology]['connected']=True
+        self.pool.close()
 
-    def get_topologies(self):
+    """
+    The topology cache is a json file {TOPOLOGY:ID} written on every
+    getClusterInfo, so a check of a single topology can go straight to
+    getTopologyInfo. The id changes when the topology is redeployed, then
+    get_topology_status falls back to getClusterInfo.
+    """
+    def load_topology_id(self):
         try:
-            socket      = TSocket.TSocket(self.nimbus_serv,self.nimbus_port)
-            transport   = TTransport.TFramedTransport(socket)
-            protocol    = TBinaryProtocol.TBinaryProtocol(transport)
-            client      = Nimbus.Client(protocol)
+            with open(self.topology_cache) as cache:
+                topology_id = json.load(cache).get(self.topology)
+        except (IOError,ValueError,TypeError):
+            return False
+        if topology_id is None:
+            return False
+        self.topologies[self.topology]={'id':topology_id,'components':{},'connected':False,'cached':True}
+        return True
 
-            transport.open()
+    def save_topology_ids(self):
+        if not self.topology_cache:
+            return
+        try:
+            tmp_file = '%s.%d' % (self.topology_cache,os.getpid())
+            with open(tmp_file,'w') as tmp:
+                json.dump(dict((name,topology['id']) for name,topology in self.topologies.items()),tmp)
+            os.rename(tmp_file,self.topology_cache)
+        except (IOError,OSError):
+            pass
+
+    """
+    The supervisor cache is a json file {HOST:LAST_SEEN} updated on every
+    capacity check, so a supervisor that drops out of Nimbus is reported
+    dead until supervisor_ttl seconds after it was last seen.
+    """
+    def track_supervisors(self,now):
+        try:
+            with open(self.supervisor_cache) as cache:
+                seen = json.load(cache)
+        except (IOError,ValueError):
+            seen = dict()
+        for host in self.cluster['supervisors']:
+            seen[host]=now
+        seen=dict((host,last_seen) for host,last_seen in seen.items() if last_seen > now - self.supervisor_ttl)
+        if self.supervisor_cache:
+            try:
+                tmp_file = '%s.%d' % (self.supervisor_cache,os.getpid())
+                with open(tmp_file,'w') as tmp:
+                    json.dump(seen,tmp)
+                os.rename(tmp_file,self.supervisor_cache)
+            except (IOError,OSError):
+                pass
+        return seen
 
-            summary = client.getClusterInfo()
-            
-            transport.close()
+    def get_topologies(self):
+        try:
+            with self.pool.client() as client:
+                summary = client.getClusterInfo()
+            self.topologies.clear()
             for topology in summary.topologies:
                 self.topologies[str(topology.name)]={'id':topology.id,'components':{},'connected':False}
+            self.cluster={'nimbus_uptime':summary.nimbus_uptime_secs,
+                'supervisors':dict((str(supervisor.host),{'used':supervisor.num_used_workers,'slots':supervisor.num_workers,'uptime':supervisor.uptime_secs}) for supervisor in summary.supervisors)}
 	    self.nimbus_connected = True
+            self.save_topology_ids()
 
-        except Thrift.TException, tx:
-            print "%s" % (tx.message)
+        except (Thrift.TException,socket.error), tx:
+            print "%s" % (tx.message or tx)
 
+    """
+    Return {COMPONENT:{'bolts','spouts'}} of the topology, or None when Nimbus
+    fails. Only the caller stores it, so a call still running after the
+    deadline does not change the topologies being reported.
+    """
     def get_topology_status(self,topology):
         try:
-            socket      = TSocket.TSocket(self.nimbus_serv,self.nimbus_port)
-            transport   = TTransport.TFramedTransport(socket)
-            protocol    = TBinaryProtocol.TBinaryProtocol(transport)
-            client      = Nimbus.Client(protocol)
-
-            transport.open()
-            executors=client.getTopologyInfo(self.topologies[topology]['id']).executors
+            try:
+                with self.pool.client() as client:
+                    executors=client.getTopologyInfo(self.topologies[topology]['id']).executors
+            except NotAliveException:
+                if not self.topologies[topology].get('cached'):
+                    raise
+                self.get_topologies()
+                if topology not in self.topologies:
+                    raise
+                with self.pool.client() as client:
+                    executors=client.getTopologyInfo(self.topologies[topology]['id']).executors
+            self.nimbus_connected = True
+            components=dict()
             for executor in executors:
                 component=executor.component_id
-                self.topologies[topology]['components'].setdefault(component, {'bolts':[], 'spouts':[]})
+                components.setdefault(component, {'bolts':[], 'spouts':[]})
                 task_start=executor.executor_info.task_start
                 task_end=executor.executor_info.task_end
                 spout_stats=executor.stats.specific.spout
                 bolt_stats=executor.stats.specific.bolt
                 if bolt_stats:
-                    self.topologies[topology]['components'][component]['bolts'].append({ 
+                    components[component]['bolts'].append({ 
                         'id':str(task_start) + '-' + str(task_end),
                         'stats' : self.boltToDict(bolt_stats)})
-	    self.topologies[topology]['connected'] = True
-        except Thrift.TException, tx:
-            print "%s" % (tx.message)
+                if spout_stats:
+                    components[component]['spouts'].append(self.spoutToArray(spout_stats,executor.stats.emitted))
+            return components
+        except (Thrift.TException,socket.error), tx:
+            print "%s" % (tx.message or tx)
 
     def boltToDict(self,bolt_stats):
         out={'process_ms_avg':{},'executed':{},'execute_ms_avg':{},'acked':{},'failed':{},'load':{}}
@@ -98,3 +241,66 @@ class StormStatus:
             out['acked'][period]=bolt_stats.acked[period].values()[0] if bolt_stats.acked[period] else 0
             out['load'][period]=out['process_ms_avg'][period]*out['executed'][period]/(int(period)*1000) if period != ":all-time" else 0
         return out
+
+    """
+    Flatten the stats of one spout executor, adding up every stream. The
+    complete latency of the streams is weighted by their acked tuples.
+    """
+    def spoutToArray(self,spout_stats,emitted):
+        out=array('d')
+        for window in self.spout_windows:
+            acked=spout_stats.acked.get(window) or {}
+            complete_ms_avg=spout_stats.complete_ms_avg.get(window) or {}
+            total_acked=sum(acked.values())
+            out.append(total_acked)
+            out.append(sum((spout_stats.failed.get(window) or {}).values()))
+            if total_acked:
+                out.append(sum([complete_ms_avg.get(stream,0)*count for stream,count in acked.items()])/total_acked)
+            else:
+                out.append(0)
+            out.append(sum((emitted.get(window) or {}).values()))
+        return out
+
+    """
+    Return the spout stats of a component, adding up its executors:
+    {WINDOW:{'acked','failed','emitted','complete_ms_avg','failed%','throughput'}}
+    where throughput is emitted tuples per second
+    """
+    def spoutSummary(self,topology,component):
+        fields=len(self.spout_fields)
+        summary=dict()
+        for position,window in enumerate(self.spout_windows):
+            offset=position*fields
+            acked=failed=emitted=latency=0.0
+            for executor in self.topologies[topology]['components'][component]['spouts']:
+                acked+=executor[offset]
+                failed+=executor[offset+1]
+                latency+=executor[offset+2]*executor[offset]
+                emitted+=executor[offset+3]
+            summary[window]={'acked':acked,
+                'failed':failed,
+                'emitted':emitted,
+                'complete_ms_avg':latency/acked if acked else 0,
+                'failed%':failed*100/(acked+failed) if acked+failed else 0,
+                'throughput':emitted/int(window)}
+        return summary
+
+    """
+    Return the worker slots capacity of the cluster from getClusterInfo:
+    {'slots','used','free','used%','full_supervisors','dead_supervisors',
+     'free_per_supervisor':{HOST:FREE}}
+    where dead_supervisors are the expected ones and the ones seen in the
+    last supervisor_ttl seconds missing from Nimbus
+    """
+    def capacity(self,expected_supervisors=()):
+        supervisors=self.cluster['supervisors']
+        slots=sum([supervisor['slots'] for supervisor in supervisors.values()])
+        used=sum([supervisor['used'] for supervisor in supervisors.values()])
+        free_per_supervisor=dict((host,supervisor['slots']-supervisor['used']) for host,supervisor in supervisors.items())
+        return {'slots':slots,
+            'used':used,
+            'free':slots-used,
+            'used%':used*100.0/slots if slots else 100.0,
+            'full_supervisors':len([host for host,free in free_per_supervisor.items() if free <= 0]),
+            'dead_supervisors':sorted([host for host in set(expected_supervisors) | set(self.known_supervisors) if host not in supervisors]),
+            'free_per_supervisor':free_per_supervisor}
@@ -34,5 +34,7 @@ class StringContext(nagiosplugin.Context):
         else:
             if self.level == "critical":
                 return self.result_cls(nagiosplugin.Critical,hint=metric.description,metric=metric)
+            elif self.level == "unknown":
+                return self.result_cls(nagiosplugin.Unknown,hint=metric.description,metric=metric)
             else:
                 return self.result_cls(nagiosplugin.Warn,hint=metric.description,metric=metric)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+"""
+Unit tests of the dfsadmin report parser
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+import dfsadminReport
+
+REPORT = """Configured Capacity: 300 (300 B)
+Present Capacity: 280 (280 B)
+DFS Remaining: 180 (180 B)
+DFS Used: 100 (100 B)
+DFS Used%: 35.71%
+Under replicated blocks: 12
+Blocks with corrupt replicas: 1
+Missing blocks: 0
+
+-------------------------------------------------
+Live datanodes (2):
+
+Name: 10.0.0.1:50010 (dn1.example.com)
+Hostname: dn1.example.com
+Decommission Status : Normal
+DFS Used%: 30.00%
+Last contact: Mon Oct 10 10:10:10 CEST 2016
+
+Name: 10.0.0.2:50010 (dn2.example.com)
+Hostname: dn2.example.com
+Decommission Status : Normal
+DFS Used%: 40.00%
+Last contact: Mon Oct 10 10:10:10 CEST 2016
+
+Dead datanodes (1):
+
+Name: 10.0.0.3:50010 (dn3.example.com)
+Hostname: dn3.example.com
+Decommission Status : Normal
+DFS Used%: 0.00%
+Last contact: Sun Oct 09 10:10:10 CEST 2016
+
+Decommissioning datanodes (1):
+
+Name: 10.0.0.4:50010 (dn4.example.com)
+Hostname: dn4.example.com
+Decommission Status : Decommission in progress
+DFS Used%: 50.00%
+Last contact: Mon Oct 10 10:10:10 CEST 2016
+"""
+
+class ParseTest(unittest.TestCase):
+    def setUp(self):
+        self.hdfsreport = dfsadminReport.parse(REPORT.splitlines(True))
+
+    def test_total(self):
+        self.assertEqual(self.hdfsreport['Total'],{
+            'DFS Used%':'35.71%',
+            'Under replicated blocks':'12',
+            'Blocks with corrupt replicas':'1',
+            'Missing blocks':'0',
+            'Datanodes available':'2'})
+
+    def test_datanodes(self):
+        self.assertEqual(sorted(self.hdfsreport),['Total','dn1.example.com','dn2.example.com','dn3.example.com','dn4.example.com'])
+        record = self.hdfsreport['dn2.example.com']
+        self.assertEqual(record['Name'],'10.0.0.2:50010')
+        self.assertEqual(record['DFS Used%'],'40.00%')
+        self.assertEqual(record['blockscanner'],None)
+
+    def test_sections(self):
+        self.assertEqual(dict((datanode,record['Section']) for datanode,record in self.hdfsreport.items() if datanode != 'Total'),{
+            'dn1.example.com':'Live',
+            'dn2.example.com':'Live',
+            'dn3.example.com':'Dead',
+            'dn4.example.com':'Decommissioning'})
+
+    def test_live_datanodes(self):
+        self.assertEqual(sorted(dfsadminReport.live_datanodes(self.hdfsreport)),['dn1.example.com','dn2.example.com'])
+
+    def test_lines_without_newline(self):
+        self.assertEqual(dfsadminReport.parse(REPORT.splitlines())['Total'],self.hdfsreport['Total'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+"""
+Unit tests of the kafka state read from zookeeper, against an in memory
+tree answering the KazooClient calls kafkaState makes
+"""
+
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+try:
+    import kafkaState
+    from kazoo.exceptions import NoNodeError
+except ImportError:
+    kafkaState = None
+
+class AsyncResult(object):
+    def __init__(self,value=None,exception=None):
+        self.value = value
+        self.exception = exception
+
+    def get(self):
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+class FakeZookeeper(object):
+    def __init__(self,tree):
+        self.tree = tree
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def children(self,path):
+        prefix = path.rstrip('/') + '/'
+        return sorted(set([node[len(prefix):].split('/')[0] for node in self.tree if node.startswith(prefix)]))
+
+    def exists(self,path):
+        return True if path in self.tree or self.children(path) else None
+
+    def get_children(self,path):
+        if not self.exists(path):
+            raise NoNodeError()
+        return self.children(path)
+
+    def pending(self,result):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight,self.in_flight)
+        get = result.get
+        def collected():
+            self.in_flight -= 1
+            return get()
+        result.get = collected
+        return result
+
+    def get_async(self,path):
+        if path not in self.tree:
+            return self.pending(AsyncResult(exception=NoNodeError()))
+        return self.pending(AsyncResult((self.tree[path],None)))
+
+    def get_children_async(self,path):
+        if not self.exists(path):
+            return self.pending(AsyncResult(exception=NoNodeError()))
+        return self.pending(AsyncResult(self.children(path)))
+
+def cluster():
+    tree = {
+        '/brokers/ids/1':json.dumps({'host':'kafka1','port':9092}),
+        '/brokers/ids/2':json.dumps({'host':'kafka2','port':9092}),
+        '/brokers/topics/events':json.dumps({'partitions':{'0':[1,2],'1':[2,1],'2':[1,2]}}),
+        '/brokers/topics/events/partitions/0/state':json.dumps({'leader':1,'isr':[1,2]}),
+        '/brokers/topics/events/partitions/1/state':json.dumps({'leader':1,'isr':[1]}),
+        '/brokers/topics/logs':json.dumps({'partitions':{'0':[3,1]}}),
+        '/consumers/etl/offsets/events/0':'90',
+        '/consumers/etl/offsets/events/1':'200',
+        '/consumers/etl/offsets/logs/0':'5',
+        '/consumers/audit/offsets/events/2':'10',
+    }
+    return FakeZookeeper(tree)
+
+@unittest.skipIf(kafkaState is None,'kazoo is not installed')
+class GetManyTest(unittest.TestCase):
+    def test_data(self):
+        zk = cluster()
+        paths = ['/brokers/ids/1','/brokers/ids/2','/brokers/ids/9']
+        self.assertEqual(kafkaState.get_many(zk,paths,1),{
+            '/brokers/ids/1':zk.tree['/brokers/ids/1'],
+            '/brokers/ids/2':zk.tree['/brokers/ids/2']})
+
+    def test_max_in_flight(self):
+        zk = FakeZookeeper(dict(('/node/%d' % i,str(i)) for i in range(50)))
+        results = kafkaState.get_many(zk,['/node/%d' % i for i in range(60)],8)
+        self.assertEqual(len(results),50)
+        self.assertEqual(zk.max_in_flight,8)
+        self.assertEqual(zk.in_flight,0)
+
+    def test_children(self):
+        zk = cluster()
+        self.assertEqual(kafkaState.get_many(zk,['/consumers/etl/offsets','/consumers/none/offsets'],children=True),
+            {'/consumers/etl/offsets':['events','logs']})
+
+@unittest.skipIf(kafkaState is None,'kazoo is not installed')
+class PartitionsTest(unittest.TestCase):
+    def setUp(self):
+        zk = cluster()
+        self.brokers = kafkaState.get_brokers(zk)
+        self.partitions = kafkaState.get_partitions(zk)
+
+    def test_brokers(self):
+        self.assertEqual(self.brokers,{1:{'host':'kafka1','port':9092},2:{'host':'kafka2','port':9092}})
+
+    def test_partitions(self):
+        self.assertEqual(self.partitions,{
+            'events':{
+                0:{'replicas':[1,2],'leader':1,'isr':[1,2]},
+                1:{'replicas':[2,1],'leader':1,'isr':[1]},
+                2:{'replicas':[1,2],'leader':-1,'isr':[]}},
+            'logs':{
+                0:{'replicas':[3,1],'leader':-1,'isr':[]}}})
+        self.assertEqual(kafkaState.get_partitions(cluster(),['logs','gone']),{
+            'logs':{0:{'replicas':[3,1],'leader':-1,'isr':[]}},
+            'gone':{}})
+        self.assertEqual(kafkaState.get_partitions(FakeZookeeper({})),{})
+
+    def test_health(self):
+        self.assertEqual(kafkaState.under_replicated(self.partitions),[('events',1),('events',2),('logs',0)])
+        self.assertEqual(kafkaState.unavailable(self.partitions,self.brokers),[('events',2),('logs',0)])
+
+    def test_broker_index(self):
+        index = kafkaState.broker_index(self.partitions,self.brokers)
+        self.assertEqual(index,{
+            1:{'leaders':2,'replicas':4,'out_of_sync':2,'preferred':2,'not_preferred':1},
+            2:{'leaders':0,'replicas':3,'out_of_sync':2,'preferred':1,'not_preferred':1},
+            3:{'leaders':0,'replicas':1,'out_of_sync':1,'preferred':1,'not_preferred':1}})
+        self.assertEqual(kafkaState.skew(index,[1,2],'leaders'),100.0)
+        self.assertAlmostEqual(kafkaState.skew(index,[1,2],'replicas'),100.0/7)
+        self.assertEqual(kafkaState.skew(index,[2,3],'leaders'),0.0)
+        self.assertEqual(kafkaState.skew(index,[],'leaders'),0.0)
+
+@unittest.skipIf(kafkaState is None,'kazoo is not installed')
+class ConsumerLagTest(unittest.TestCase):
+    def test_offsets(self):
+        self.assertEqual(kafkaState.get_consumer_offsets(cluster()),{
+            'etl':{'events':{0:90,1:200},'logs':{0:5}},
+            'audit':{'events':{2:10}}})
+        self.assertEqual(kafkaState.get_consumer_offsets(cluster(),['audit','gone']),{'audit':{'events':{2:10}}})
+        self.assertEqual(kafkaState.get_consumer_offsets(FakeZookeeper({})),{})
+
+    def test_lag(self):
+        offsets = kafkaState.get_consumer_offsets(cluster())
+        log_end = {'events':{0:100,1:150,2:40}}
+        self.assertEqual(kafkaState.consumer_lag(offsets,log_end),{('etl','events'):10,('audit','events'):30})
+
+    def test_shell_log_end_offsets(self):
+        directory = tempfile.mkdtemp()
+        try:
+            run_class = os.path.join(directory,'kafka-run-class.sh')
+            with open(run_class,'w') as script:
+                script.write('#!/bin/sh\n'
+                    'case "$5" in\n'
+                    'events) echo events:0:100; echo events:1:150 ;;\n'
+                    '*) echo "unknown topic $5" >&2 ;;\n'
+                    'esac\n')
+            os.chmod(run_class,stat.S_IRWXU)
+            brokers = {1:{'host':'kafka1','port':9092}}
+            results,errors = kafkaState.shell_log_end_offsets({'events':[0,1],'gone':[0]},brokers,2,10,run_class)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(results,{'events':{0:100,1:150}})
+        self.assertEqual(errors,{'gone':'unknown topic gone'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+"""
+Unit tests of the select based four letter word client against local
+servers
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+import netcat
+
+def listen():
+    server = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+    server.bind(('127.0.0.1',0))
+    server.listen(16)
+    return server
+
+def serve(server,answer):
+    """
+    Answer every connection with answer(command) and close it, or keep it
+    open without answering when answer returns None
+    """
+    hung = []
+    def loop():
+        while 1:
+            try:
+                connection,address = server.accept()
+            except socket.error:
+                return
+            command = connection.recv(4)
+            reply = answer(command)
+            if reply is None:
+                hung.append(connection)
+                continue
+            connection.sendall(reply)
+            connection.close()
+    thread = threading.Thread(target=loop)
+    thread.daemon = True
+    thread.start()
+    return hung
+
+def refused_port():
+    s = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    s.bind(('127.0.0.1',0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+class NetcatManyTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.close()
+
+    def server(self,answer):
+        server = listen()
+        self.servers.append(server)
+        self.hung = serve(server,answer)
+        return server.getsockname()[1]
+
+    def test_answers(self):
+        port = self.server(lambda command: command.upper() + b'\n' * 5000)
+        requests = [('127.0.0.1',port,b'ruok'),('127.0.0.1',port,b'stat')]
+        results,errors,timings = netcat.netcat_many(requests,2)
+        self.assertEqual(errors,{})
+        self.assertEqual(results[('127.0.0.1',port,b'ruok')],b'RUOK' + b'\n' * 5000)
+        self.assertEqual(results[('127.0.0.1',port,b'stat')],b'STAT' + b'\n' * 5000)
+        self.assertEqual(sorted(timings),sorted(requests))
+
+    def test_refused(self):
+        port = refused_port()
+        request = ('127.0.0.1',port,b'ruok')
+        results,errors,timings = netcat.netcat_many([request],2)
+        self.assertEqual(results,{})
+        self.assertTrue('refused' in errors[request].lower(),errors[request])
+        self.assertTrue(request in timings)
+
+    def test_timeout(self):
+        port = self.server(lambda command: None)
+        answering = self.server(lambda command: b'imok')
+        hung = ('127.0.0.1',port,b'ruok')
+        ok = ('127.0.0.1',answering,b'ruok')
+        start = time.time()
+        results,errors,timings = netcat.netcat_many([hung,ok],0.3)
+        self.assertTrue(time.time() - start < 2)
+        self.assertEqual(results,{ok:b'imok'})
+        self.assertEqual(errors,{hung:'timed out'})
+        self.assertTrue(timings[hung] >= 0.3)
+
+    def test_deadline(self):
+        port = self.server(lambda command: None)
+        request = ('127.0.0.1',port,b'mntr')
+        results,errors,timings = netcat.netcat_many([request],5,0.2)
+        self.assertEqual(errors,{request:'timed out'})
+        self.assertTrue(timings[request] < 2)
+
+    def test_netcat(self):
+        port = self.server(lambda command: b'imok')
+        self.assertEqual(netcat.netcat('127.0.0.1',port,b'ruok',2),b'imok')
+        self.assertRaises(socket.error,netcat.netcat,'127.0.0.1',refused_port(),b'ruok',2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+"""
+Unit tests of parallel.map_bounded, run from the repository root with
+
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+import parallel
+
+class MapBoundedTest(unittest.TestCase):
+    def test_results(self):
+        results,errors = parallel.map_bounded(lambda item: item * 2,range(20),4)
+        self.assertEqual(results,dict((item,item * 2) for item in range(20)))
+        self.assertEqual(errors,{})
+
+    def test_no_items(self):
+        self.assertEqual(parallel.map_bounded(lambda item: item,[],4,1),({},{}))
+
+    def test_exceptions_are_errors(self):
+        def func(item):
+            if item % 3 == 0:
+                raise ValueError('bad item %d' % item)
+            return item
+        results,errors = parallel.map_bounded(func,range(9),3)
+        self.assertEqual(sorted(results),[1,2,4,5,7,8])
+        self.assertEqual(errors,{0:'bad item 0',3:'bad item 3',6:'bad item 6'})
+
+    def test_workers_bound(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+        def func(item):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0],running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+        parallel.map_bounded(func,range(30),5)
+        self.assertTrue(1 < peak[0] <= 5)
+
+    def test_deadline(self):
+        release = threading.Event()
+        def func(item):
+            if item == 'hung':
+                release.wait(5)
+            return item
+        start = time.time()
+        results,errors = parallel.map_bounded(func,['a','hung','b'],3,0.2)
+        elapsed = time.time() - start
+        release.set()
+        self.assertEqual(results,{'a':'a','b':'b'})
+        self.assertEqual(errors,{'hung':'deadline exceeded'})
+        self.assertTrue(elapsed < 2)
+
+    def test_deadline_leaves_queued_items(self):
+        release = threading.Event()
+        results,errors = parallel.map_bounded(lambda item: release.wait(5),range(4),1,0.1)
+        release.set()
+        self.assertEqual(results,{})
+        self.assertEqual(errors,dict((item,'deadline exceeded') for item in range(4)))
+
+if __name__ == '__main__':
+    unittest.main()
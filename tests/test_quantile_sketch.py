@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+"""
+Unit tests of the quantile sketch used for the oozie action runtimes
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+import quantileSketch
+
+QUANTILES = [0.0,0.01,0.25,0.5,0.75,0.9,0.95,0.99,1.0]
+
+def exact(values,q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+class QuantileSketchTest(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(42)
+        self.values = [generator.lognormvariate(4,1.5) for i in range(5000)]
+
+    def assertRelativeError(self,sketch,values,accuracy):
+        for q in QUANTILES:
+            expected = exact(values,q)
+            self.assertTrue(abs(sketch.quantile(q) - expected) <= accuracy * expected,
+                'p%g is %f, expected %f' % (q * 100,sketch.quantile(q),expected))
+
+    def test_empty(self):
+        self.assertEqual(quantileSketch.QuantileSketch().quantile(0.5),None)
+
+    def test_relative_error(self):
+        for accuracy in [0.01,0.02,0.05]:
+            sketch = quantileSketch.QuantileSketch(accuracy,4096)
+            for value in self.values:
+                sketch.add(value)
+            self.assertEqual(sketch.count,len(self.values))
+            self.assertRelativeError(sketch,self.values,accuracy)
+
+    def test_zeros(self):
+        sketch = quantileSketch.QuantileSketch()
+        for value in [0,0,0,10,20]:
+            sketch.add(value)
+        self.assertEqual(sketch.quantile(0.5),0.0)
+        self.assertTrue(abs(sketch.quantile(1.0) - 20) <= 0.02 * 20)
+
+    def test_merge(self):
+        merged = quantileSketch.QuantileSketch()
+        whole = quantileSketch.QuantileSketch()
+        for part in [self.values[:1000],self.values[1000:3500],self.values[3500:]]:
+            sketch = quantileSketch.QuantileSketch()
+            for value in part:
+                sketch.add(value)
+                whole.add(value)
+            merged.merge(sketch)
+        self.assertEqual(merged.count,whole.count)
+        self.assertEqual(merged.bins,whole.bins)
+        self.assertRelativeError(merged,self.values,0.02)
+
+    def test_collapse_keeps_high_quantiles(self):
+        sketch = quantileSketch.QuantileSketch(0.02,64)
+        for value in self.values:
+            sketch.add(value)
+        self.assertEqual(len(sketch.bins),64)
+        self.assertEqual(sketch.count,len(self.values))
+        for q in [0.95,0.99,1.0]:
+            expected = exact(self.values,q)
+            self.assertTrue(abs(sketch.quantile(q) - expected) <= 0.02 * expected)
+
+    def test_dict_round_trip(self):
+        sketch = quantileSketch.QuantileSketch()
+        for value in self.values + [0]:
+            sketch.add(value)
+        restored = quantileSketch.QuantileSketch.from_dict(sketch.to_dict())
+        self.assertEqual(restored.count,sketch.count)
+        self.assertEqual(restored.zeros,1)
+        for q in QUANTILES:
+            self.assertEqual(restored.quantile(q),sketch.quantile(q))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# vim: ts=4:sw=4:et:sts=4:ai:tw=80
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements. See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership. The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# AUTHOR: Juan Carlos Fernandez <jcfernandez@redoop.org>
+
+"""
+Unit tests of the per host summaries of the datanode and nodemanager sweeps
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+import stats
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = range(1,101)
+        self.assertEqual(stats.percentile(values,50),51)
+        self.assertEqual(stats.percentile(values,95),96)
+        self.assertEqual(stats.percentile(values,100),100)
+        self.assertEqual(stats.percentile([7],95),7)
+
+    def test_empty(self):
+        self.assertEqual(stats.percentile([],95),0)
+
+class SummarizeTest(unittest.TestCase):
+    def test_summary(self):
+        values = dict(('dn%02d' % i,i) for i in range(1,21))
+        summary = stats.summarize(values)
+        self.assertEqual(summary['count'],20)
+        self.assertEqual(summary['p50'],11)
+        self.assertEqual(summary['p95'],20)
+        self.assertEqual(summary['max'],20)
+        self.assertEqual(summary['worst'],[('dn20',20),('dn19',19),('dn18',18)])
+
+    def test_top(self):
+        summary = stats.summarize({'a':1.5,'b':0.5,'c':3.0},top=2)
+        self.assertEqual(summary['worst'],[('c',3.0),('a',1.5)])
+        self.assertEqual(stats.summarize({'a':1},top=3)['worst'],[('a',1)])
+
+    def test_empty(self):
+        self.assertEqual(stats.summarize({}),{'count':0,'p50':0,'p95':0,'max':0,'worst':[]})
+
+if __name__ == '__main__':
+    unittest.main()